@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import namedtuple
+import requests
+from requests.adapters import HTTPAdapter
+
+# Latest poll result; replaced by reference assignment so the render thread reads it without a lock.
+# bbox is (x1, y1, x2, y2) or None when the camera reports no subject; t is time.monotonic().
+BBoxSample = namedtuple("BBoxSample", "bbox t")
+
+
+def parse_bbox(data):
+    objs = data["data"]["objs"]
+    if not objs:
+        return None
+    obj = objs[0]
+    return obj["X"], obj["Y"], obj["X"] + obj["Width"], obj["Y"] + obj["Height"]
+
+
+class BBoxPoller:
+    """Polls the camera's tracking API on its own thread over one keep-alive connection."""
+
+    def __init__(self, url, poll_hz=10.0, timeout=0.3, stale_after=1.0):
+        self.url = url
+        self.interval = 1.0 / poll_hz
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self.sample = None
+
+        self.polls = 0
+        self.failed = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.last_request_ms = 0.0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._poll, daemon=True)
+        self.thread.start()
+
+    def _poll(self):
+        while not self._stop.is_set():
+            start = time.monotonic()
+            self.polls += 1
+            try:
+                response = self.session.get(self.url, timeout=self.timeout)
+                response.raise_for_status()
+                bbox = parse_bbox(response.json())
+            except (requests.RequestException, ValueError, KeyError, TypeError, IndexError) as e:
+                self.failed += 1
+                self.consecutive_failures += 1
+                if self.consecutive_failures == 1 or self.last_error != str(e):
+                    print(f"[BBOX] Error: {e}")
+                self.last_error = str(e)
+            else:
+                self.sample = BBoxSample(bbox, time.monotonic())
+                self.consecutive_failures = 0
+            self.last_request_ms = (time.monotonic() - start) * 1000.0
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - start)))
+        self.session.close()
+
+    def age(self, now=None):
+        sample = self.sample
+        if sample is None:
+            return None
+        return (now or time.monotonic()) - sample.t
+
+    def is_stale(self, now=None):
+        age = self.age(now)
+        return age is None or age > self.stale_after
+
+    def latest(self, now=None):
+        # Never blocks; None if there's no subject or the last good poll is older than stale_after.
+        sample = self.sample
+        if sample is None or (now or time.monotonic()) - sample.t > self.stale_after:
+            return None
+        return sample.bbox
+
+    def format(self):
+        age = self.age()
+        state = "no data" if age is None else ("STALE" if age > self.stale_after else "ok")
+        age_text = "" if age is None else f" age {age * 1000:.0f} ms"
+        return (f"bbox: {state}{age_text}  request {self.last_request_ms:.0f} ms  "
+                f"failed {self.failed}/{self.polls}")
+
+    def stop(self):
+        # Called on the render thread: don't wait out an in-flight request, the thread exits by itself.
+        self._stop.set()
@@ -1,80 +1,153 @@
+import math
 import time
+from collections import namedtuple
+import pose_filter
+from pose_filter import AlphaBetaFilter, extrapolate
+from pose_history import PoseHistory
+from tilt_calibration import TiltCalibrator
+
+
+# Immutable snapshot of one complete pose. The writer builds a new one per
+# packet and publishes it with a single reference assignment, so a reader
+# always sees every field from the same packet and never allocates.
+# `t` is the monotonic sample time the filtered values and rates refer to.
+class CameraPose(namedtuple("CameraPose", "seq pan tilt zoom x y z t pan_rate tilt_rate zoom_rate focus",
+                            defaults=(0.0, 0.0, 0.0, 0.0, 0))):
+    __slots__ = ()
+
 
 class CameraState:
-    def __init__(self):
-        self.x = 0
-        self.y = -10
-        self.z = 2
-        self.pan = 0
-        self.tilt = 0
-        self.zoom = 0
+    # `clock` returns monotonic seconds; replays inject a virtual clock so runs are reproducible.
+    def __init__(self, clock=None):
+        self.clock = clock or _clock
+        self.pose = CameraPose(seq=0, pan=0, tilt=0, zoom=0, x=0, y=-10, z=2)
+        # Every published pose, so video can be matched with the pose from its capture time.
+        self.history = PoseHistory()
 
         self._raw_pan = 0
         self._raw_tilt = 0
         self._raw_zoom = 0
 
-        self.last_freed_time = 0
-        self.last_idle_start = time.time()
+        self._pan_filter = AlphaBetaFilter(wrap=360.0)
+        self._tilt_filter = AlphaBetaFilter()
+        self._zoom_filter = AlphaBetaFilter()
+
+        self.last_freed_time = float("-inf")
+        self.last_idle_start = self.clock()
 
-        self.tilt_buffer = []
-        self.tilt_offset = 0
-        self.collecting_tilt = False
-        self.tilt_start_time = None
+        self.tilt_calibrator = TiltCalibrator()
         self.auto_calibrate_tilt = True
 
     def should_idle(self, timeout=2.0):
-        idle = (time.time() - self.last_freed_time) > timeout
-        if idle and (time.time() - self.last_idle_start > timeout):
-            self.last_idle_start = time.time()  # Reset to avoid drift
+        now = self.clock()
+        idle = (now - self.last_freed_time) > timeout
+        if idle and (now - self.last_idle_start > timeout):
+            self.last_idle_start = now  # Reset to avoid drift
         return idle
 
     def mark_freed_received(self):
-        self.last_freed_time = time.time()
-        self.last_idle_start = time.time()
+        now = self.clock()
+        self.last_freed_time = now
+        self.last_idle_start = now
 
         if self.auto_calibrate_tilt:
-            now = time.time()
-
-            if not self.collecting_tilt:
-                if self.tilt_start_time is None:
-                    self.tilt_start_time = now
-                elif now - self.tilt_start_time > 3:
-                    self.collecting_tilt = True
-                    self.tilt_buffer = []
-                    print("[Tilt Calibration] Starting tilt capture window...")
-
-            elif self.collecting_tilt:
-                self.tilt_buffer.append(self._raw_tilt)
-                if now - self.tilt_start_time > 8:
-                    self.tilt_offset = sorted(self.tilt_buffer)[len(self.tilt_buffer) // 2]
-                    print(f"[Tilt Calibration] Median tilt offset set to {self.tilt_offset:.2f}°")
-                    self.collecting_tilt = False
-                    self.tilt_start_time = None
-
-    def update_from_freed(self, pan, tilt, zoom=0):
+            pose = self.pose
+            self.tilt_calibrator.add(self._raw_tilt, pose.tilt_rate, pose.t)
+
+    @property
+    def tilt_offset(self):
+        return self.tilt_calibrator.offset
+
+    @property
+    def tilt_confidence(self):
+        return self.tilt_calibrator.confidence
+
+    def reset_tilt_calibration(self):
+        self.tilt_calibrator.reset()
+        print("[Tilt Calibration] Reset")
+
+    def update_from_freed(self, pan, tilt, zoom=0, t=None, focus=0):
+        if t is None:
+            t = self.clock()
         self._raw_pan = pan
         self._raw_tilt = tilt
         self._raw_zoom = zoom
 
-        if self.auto_calibrate_tilt:
+        # An unconfirmed offset may be a framed shot rather than the rest position.
+        if self.auto_calibrate_tilt and self.tilt_calibrator.established:
             tilt -= self.tilt_offset
 
-        pan = max(min(pan, 180), -180)
         tilt = max(min(tilt, 90), -30)
 
-        pan = round(pan * 4) / 4
-        tilt = round(tilt * 2) / 2
-
+        # Jitter is magnified at the tele end, so lean harder on the motion model there.
         zoom_ratio = (zoom - 0x000000) / float(0x400000)
         zoom_ratio = max(0.0, min(1.0, zoom_ratio))
-
-        smoothing_pan = 0.15
-        smoothing_tilt = max(0.05, 0.25 - zoom_ratio * 0.2)
-        smoothing_zoom = 0.15
-
-        self.pan = (1 - smoothing_pan) * self.pan + smoothing_pan * pan
-        self.tilt = (1 - smoothing_tilt) * self.tilt + smoothing_tilt * tilt
-        self.zoom = (1 - smoothing_zoom) * self.zoom + smoothing_zoom * zoom
-
+        gain = 1.0 - zoom_ratio * (1.0 - pose_filter.settings["tele_gain"])
+        alpha = pose_filter.settings["alpha"]
+        beta = pose_filter.settings["beta"]
+
+        self._pan_filter.update(pan, t, alpha * gain, beta * gain)
+        self._tilt_filter.update(tilt, t, alpha * gain, beta * gain)
+        self._zoom_filter.update(zoom, t, alpha, beta)
+
+        self.publish(self._pan_filter.value, self._tilt_filter.value, self._zoom_filter.value,
+                     t, self._pan_filter.rate, self._tilt_filter.rate, self._zoom_filter.rate, focus)
+
+    def publish(self, pan, tilt, zoom, t=0.0, pan_rate=0.0, tilt_rate=0.0, zoom_rate=0.0, focus=0):
+        prev = self.pose
+        pose = CameraPose(prev.seq + 1, pan, tilt, zoom, prev.x, prev.y, prev.z,
+                          t, pan_rate, tilt_rate, zoom_rate, focus)
+        self.history.append(pose)
+        self.pose = pose
+
+    def predict(self, at=None, pose=None):
+        # Extrapolate the filtered pose to display time (now + latency target by default).
+        if pose is None:
+            pose = self.pose
+        if at is None:
+            at = self.clock() + pose_filter.settings["latency_ms"] / 1000.0
+        return (
+            extrapolate(pose.pan, pose.pan_rate, pose.t, at),
+            extrapolate(pose.tilt, pose.tilt_rate, pose.t, at),
+            extrapolate(pose.zoom, pose.zoom_rate, pose.t, at),
+        )
+
+    def pose_at(self, t):
+        # The filtered pose as it was (or will be) at monotonic time t.
+        return self.history.sample(t) or self.pose
+
+    def snapshot(self):
+        return self.pose
+
+    # Read-only views of the latest pose; use snapshot() to read several fields consistently.
+    pan = property(lambda self: self.pose.pan)
+    tilt = property(lambda self: self.pose.tilt)
+    zoom = property(lambda self: self.pose.zoom)
+    x = property(lambda self: self.pose.x)
+    y = property(lambda self: self.pose.y)
+    z = property(lambda self: self.pose.z)
+
+
+def idle_pose(elapsed):
+    # Slow pan/tilt sway shown while no FreeD data arrives; returns (pan, tilt).
+    return 20 * math.sin(elapsed * 0.5), 5 * math.cos(elapsed * 0.3)
+
+
+_clock = time.monotonic
 
 shared_camera = CameraState()
+camera_states = {}
+
+def get_camera_state(camera_id):
+    state = camera_states.get(camera_id)
+    if state is None:
+        state = camera_states[camera_id] = CameraState()
+    return state
+
+def set_clock(clock=None):
+    # Switch every camera state, and those created later, to `clock` (None restores time.monotonic).
+    global _clock
+    _clock = clock or time.monotonic
+    for state in [shared_camera, *camera_states.values()]:
+        state.clock = _clock
+        state.last_idle_start = _clock()
@@ -0,0 +1,317 @@
+import argparse
+import csv
+import mmap
+import os
+import select
+import socket
+import struct
+import time
+import numpy as np
+
+# FreeD session captures: raw datagrams with their monotonic arrival times in
+# an append-only file of fixed-size records, so a capture can be memory-mapped
+# and indexed directly while it is still being written.
+#
+#   python freed_capture.py record session.fdcap --port 19148
+#   python freed_capture.py replay session.fdcap --speed 4      # 4× real time to 127.0.0.1:19148
+#   python freed_capture.py replay session.fdcap --fast         # as fast as the socket allows
+#   python freed_capture.py simulate session.fdcap -o poses.csv # in-process, virtual clock
+#
+# simulate runs the captured datagrams through the listener's own packet path
+# with a virtual clock, so filtering, tilt calibration and idle detection come
+# out identical on every run and far faster than real time. Its CSV doubles as
+# a pose trace for `main.py --benchmark --trace`.
+
+MAGIC = b"FDCAP\x00\x00\x01"
+HEADER = struct.Struct("<8sHHdd4x")   # magic, version, record size, wall-clock start, monotonic start
+RECORD = struct.Struct("<dIHHI")      # arrival (monotonic s), source IPv4, source port, datagram length, batch
+PAYLOAD_SIZE = 48                     # D1 is 29 bytes; longer datagrams are truncated but keep their length
+RECORD_SIZE = RECORD.size + PAYLOAD_SIZE
+VERSION = 2
+RECORD_DTYPE = np.dtype([
+    ("t", "<f8"), ("addr", "<u4"), ("port", "<u2"), ("length", "<u2"), ("batch", "<u4"),
+    ("data", "u1", (PAYLOAD_SIZE,)),
+])
+# Version 1 had no batch field; its listener stamped a whole receive batch with one arrival time.
+RECORD_DTYPE_V1 = np.dtype([
+    ("t", "<f8"), ("addr", "<u4"), ("port", "<u2"), ("length", "<u2"), ("data", "u1", (PAYLOAD_SIZE,)),
+])
+RECORD_DTYPES = {1: RECORD_DTYPE_V1, 2: RECORD_DTYPE}
+
+
+def _pack_addr(addr):
+    if not addr:
+        return 0, 0
+    return struct.unpack("!I", socket.inet_aton(addr[0]))[0], addr[1]
+
+
+class CaptureWriter:
+    """Appends datagrams to a capture.
+
+    `batch` is any key the caller shares between datagrams that were handled
+    together (one drain of the socket); each change of key starts a new batch
+    id, so simulate can coalesce them the way the listener did. None gives the
+    datagram a batch of its own.
+    """
+
+    def __init__(self, path, flush_interval=0.5):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.records = 0
+        self.truncated = 0
+        self.batch = 0
+        self._batch_key = None
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new:
+            with open(path, "rb") as f:
+                magic, version, record_size, _, _ = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or record_size != RECORD_SIZE:
+                raise ValueError(f"{path} is not a version {VERSION} FreeD capture")
+        self.file = open(path, "ab")
+        if new:
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD_SIZE, time.time(), time.monotonic()))
+        else:
+            # Drop a partial record left by a crash so appended records stay aligned.
+            size = os.path.getsize(path)
+            count = (size - HEADER.size) // RECORD_SIZE
+            self.file.truncate(HEADER.size + count * RECORD_SIZE)
+            if count:
+                # Carry on after the last batch id so appended batches never merge with it.
+                with open(path, "rb") as f:
+                    f.seek(HEADER.size + (count - 1) * RECORD_SIZE)
+                    self.batch = RECORD.unpack(f.read(RECORD.size))[4] + 1
+        self._record = bytearray(RECORD_SIZE)
+        self._last_flush = time.monotonic()
+
+    def write(self, data, arrival, addr=None, batch=None):
+        if self.file is None:
+            return  # closed while the listener thread was mid-batch
+        if batch is None or batch != self._batch_key:
+            if self.records:
+                self.batch = (self.batch + 1) & 0xFFFFFFFF
+            self._batch_key = batch
+        length = len(data)
+        if length > PAYLOAD_SIZE:
+            self.truncated += 1
+        ip, port = _pack_addr(addr)
+        record = self._record
+        RECORD.pack_into(record, 0, arrival, ip, port, length, self.batch)
+        payload = min(length, PAYLOAD_SIZE)
+        record[RECORD.size:RECORD.size + payload] = data[:payload]
+        record[RECORD.size + payload:] = bytes(PAYLOAD_SIZE - payload)
+        self.file.write(record)
+        self.records += 1
+        if arrival - self._last_flush > self.flush_interval:
+            self._last_flush = arrival
+            self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+class CaptureReader:
+    """Memory-mapped view of a capture; `records` is a structured array over the file, nothing is copied."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError(f"{path} is not a FreeD capture")
+            magic, self.version, record_size, self.wall_start, self.monotonic_start = HEADER.unpack(header)
+            dtype = RECORD_DTYPES.get(self.version)
+            if magic != MAGIC or dtype is None or record_size != dtype.itemsize:
+                raise ValueError(f"{path} is not a FreeD capture this version can read")
+            count = (os.path.getsize(path) - HEADER.size) // record_size
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if count else None
+        self.records = np.frombuffer(self._map, dtype, count, HEADER.size) if count else np.empty(0, dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def duration(self):
+        return float(self.records["t"][-1] - self.records["t"][0]) if len(self.records) else 0.0
+
+    def batch_starts(self):
+        # Index of the first record of each receive batch; version 1 captures mark a batch by its shared stamp.
+        key = self.records["batch"] if "batch" in self.records.dtype.names else self.records["t"]
+        return np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1]))) if len(key) else np.empty(0, int)
+
+    def datagram(self, index):
+        record = self.records[index]
+        return record["data"][:min(int(record["length"]), PAYLOAD_SIZE)].tobytes()
+
+    def close(self):
+        self.records = None
+        if self._map:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # a caller still holds a view of the records; the map closes when it's released
+            self._map = None
+
+
+class VirtualClock:
+    """Monotonic clock that only moves when told to; pass it to CameraState for deterministic replays."""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance_to(self, t):
+        if t > self.now:
+            self.now = t
+
+
+def record(path, ports, ip="0.0.0.0", rcvbuf_bytes=1 << 20):
+    socks = []
+    for port in ports:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf_bytes)
+        sock.bind((ip, port))
+        sock.setblocking(False)
+        socks.append(sock)
+    writer = CaptureWriter(path)
+    buffer = bytearray(2048)
+    print(f"[Capture] Recording {ip}:{','.join(map(str, ports))} → {path} (Ctrl+C to stop)")
+    try:
+        while True:
+            readable, _, _ = select.select(socks, [], [], 1.0)
+            for sock in readable:
+                while True:
+                    try:
+                        length, addr = sock.recvfrom_into(buffer)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    writer.write(memoryview(buffer)[:length], time.monotonic(), addr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+        for sock in socks:
+            sock.close()
+    print(f"[Capture] {writer.records} datagrams written ({writer.truncated} truncated)")
+
+
+def replay(reader, host="127.0.0.1", port=19148, speed=1.0):
+    # speed 1 is real time, 4 is four times faster, 0 sends as fast as possible.
+    if not len(reader):
+        return 0
+    times = reader.records["t"]
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        start = time.monotonic()
+        for i in range(len(times)):
+            if speed > 0:
+                delay = (times[i] - times[0]) / speed - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            sock.sendto(reader.datagram(i), (host, port))
+    return len(times)
+
+
+def simulate(reader, on_frame=None, frame_interval=None):
+    # Feed the datagrams through the listener's own parsing with arrival times from the capture.
+    # Each receive batch is coalesced to the newest pose per camera, as it was live.
+    import camera_state
+    import freed_listener
+
+    freed_listener.configure_pipeline(freed_listener.load_freed_config())
+    times = reader.records["t"]
+    clock = VirtualClock(float(times[0]) if len(reader) else 0.0)
+    camera_state.set_clock(clock)
+    next_frame = clock()
+    starts = reader.batch_starts()
+    for first, end in zip(starts, np.append(starts[1:], len(reader))):
+        # The listener applies a batch once its last datagram is in.
+        t = float(times[end - 1])
+        if frame_interval and on_frame:
+            while next_frame < t:
+                clock.advance_to(next_frame)
+                on_frame(clock())
+                next_frame += frame_interval
+        clock.advance_to(t)
+        freed_listener.apply_freed_batch((reader.datagram(i), float(times[i])) for i in range(first, end))
+        if on_frame and not frame_interval:
+            on_frame(t)
+    return clock
+
+
+def _simulate_to_csv(reader, out_path, fps):
+    from camera_state import shared_camera
+    import pose_filter
+    latency = pose_filter.settings["latency_ms"] / 1000.0
+    with open(out_path, "w", newline="") as f:
+        out = csv.writer(f)
+        out.writerow(["t", "pan", "tilt", "zoom", "x", "y", "z", "focus", "idle"])
+
+        def frame(now):
+            pose = shared_camera.snapshot()
+            pan, tilt, zoom = shared_camera.predict(at=now + latency, pose=pose)
+            out.writerow([f"{now - reader.records['t'][0]:.6f}", f"{pan:.6f}", f"{tilt:.6f}", int(zoom),
+                          pose.x, pose.y, pose.z, pose.focus, int(shared_camera.should_idle())])
+
+        simulate(reader, frame, 1.0 / fps if fps else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record, replay and simulate FreeD captures")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rec = commands.add_parser("record", help="capture datagrams from UDP ports")
+    rec.add_argument("path")
+    rec.add_argument("--ip", default="0.0.0.0")
+    rec.add_argument("--port", type=int, nargs="+", default=[19148])
+
+    rep = commands.add_parser("replay", help="send a capture to a UDP port")
+    rep.add_argument("path")
+    rep.add_argument("--host", default="127.0.0.1")
+    rep.add_argument("--port", type=int, default=19148)
+    rep.add_argument("--speed", type=float, default=1.0, help="time scale (1 = real time)")
+    rep.add_argument("--fast", action="store_true", help="send as fast as possible")
+    rep.add_argument("--loop", action="store_true", help="repeat until interrupted")
+
+    sim = commands.add_parser("simulate", help="run a capture through the pose pipeline on a virtual clock")
+    sim.add_argument("path")
+    sim.add_argument("-o", "--output", default="poses.csv", help="per-frame pose CSV")
+    sim.add_argument("--fps", type=float, default=60.0, help="render rate to sample poses at (0: per packet)")
+
+    info = commands.add_parser("info", help="summarise a capture")
+    info.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.path, args.port, args.ip)
+        return
+
+    reader = CaptureReader(args.path)
+    if args.command == "info":
+        lengths = reader.records["length"]
+        rate = len(reader) / reader.duration if reader.duration else 0.0
+        print(f"{args.path}: {len(reader)} datagrams over {reader.duration:.2f}s ({rate:.1f}/s), "
+              f"{int(np.count_nonzero(lengths != 29))} not D1-sized")
+    elif args.command == "replay":
+        speed = 0.0 if args.fast else args.speed
+        try:
+            while True:
+                start = time.monotonic()
+                sent = replay(reader, args.host, args.port, speed)
+                print(f"[Replay] Sent {sent} datagrams in {time.monotonic() - start:.2f}s")
+                if not args.loop:
+                    break
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "simulate":
+        start = time.monotonic()
+        _simulate_to_csv(reader, args.output, args.fps)
+        print(f"[Simulate] {len(reader)} datagrams ({reader.duration:.1f}s of capture) in "
+              f"{time.monotonic() - start:.2f}s → {args.output}")
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
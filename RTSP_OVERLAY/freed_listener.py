@@ -1,37 +1,284 @@
+import json
+import os
+import select
 import socket
 import threading
-from camera_state import shared_camera
+import time
+import numpy as np
+import pose_filter
+import tilt_calibration
+from camera_state import shared_camera, camera_states, get_camera_state
+from freed_capture import CaptureWriter
+from freed_protocol import D1_DTYPE, decode_d1, decode_d1_batch
+from freed_service import FreeDIngestService
+
+CONFIG_PATH = os.path.join("config", "freed.json")
+DEFAULT_CONFIG = {
+    "ip": "0.0.0.0",
+    "port": 19148,
+    "rcvbuf_bytes": 1 << 20,
+    "ring_slots": 256,
+    "backend": "drain",
+    "endpoints": None,
+    "primary_camera_id": None,
+    "pose_filter": {},
+    "tilt_calibration": {},
+    "latency_hud": False,
+    "latency_dump_interval_s": 10.0,
+    "capture_path": None,
+}
+SLOT_SIZE = 64  # Larger than a D1 packet so oversize datagrams are still counted
+
+listener_thread = None
+listener_stop = threading.Event()
+freed_service = None
+primary_camera_id = None
+followed_camera_id = None
+capture_writer = None
+
+
+class ListenerStats:
+    def __init__(self):
+        self.received = 0
+        self.coalesced = 0
+        self.malformed = 0
+        self.kernel_dropped = 0
+        self._drops_baseline = None
+        self._drops_checked = 0.0
+
+    def refresh_kernel_drops(self, port, interval=1.0):
+        now = time.monotonic()
+        if now - self._drops_checked < interval:
+            return
+        self._drops_checked = now
+        drops = read_kernel_drops(port)
+        if drops is None:
+            return
+        if self._drops_baseline is None:
+            self._drops_baseline = drops
+        self.kernel_dropped = drops - self._drops_baseline
+
+    def __repr__(self):
+        return (f"received={self.received} coalesced={self.coalesced} "
+                f"malformed={self.malformed} kernel_dropped={self.kernel_dropped}")
+
+
+listener_stats = ListenerStats()
+
+
+def load_freed_config(path=CONFIG_PATH):
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(path):
+        with open(path) as f:
+            config.update(json.load(f))
+    return config
 
-def parse_freed_packet(data):
-    print(f"Received FreeD packet ({len(data)} bytes): {data.hex()}")
-    if len(data) < 26:
-        print("⚠️ Packet too short.")
-        return
 
+def read_kernel_drops(port):
+    # Linux exposes per-socket drop counters in /proc/net/udp; elsewhere we can't tell.
     try:
-        raw_pan = int.from_bytes(data[3:6], byteorder='big', signed=True)
-        raw_tilt = int.from_bytes(data[6:9], byteorder='big', signed=True)
-        raw_zoom = int.from_bytes(data[21:24], byteorder='big', signed=False)
+        with open("/proc/net/udp") as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if int(fields[1].split(":")[1], 16) == port:
+                    return int(fields[-1])
+    except (OSError, ValueError, IndexError, StopIteration):
+        pass
+    return None
 
-        pan_deg = raw_pan / 32768.0 * 180
-        tilt_deg = raw_tilt / 32768.0 * 120
 
-        print(f"Parsed → Pan: {pan_deg:.2f}°, Tilt: {tilt_deg:.2f}°, Zoom Raw: {raw_zoom}")
-        shared_camera.update_from_freed(pan_deg, tilt_deg, raw_zoom)
+def apply_freed_pose(camera_id, pan_deg, tilt_deg, raw_zoom, arrival=None, raw_focus=0):
+    global followed_camera_id
+    if arrival is None:
+        arrival = time.monotonic()
+    state = get_camera_state(camera_id)
+    state.update_from_freed(pan_deg, tilt_deg, raw_zoom, t=arrival, focus=raw_focus)
+    state.mark_freed_received()
+
+    # Without a primary camera configured, the single-view UI follows the first head heard from.
+    # Mixing heads would make the shared filter see jumps between unrelated poses.
+    if primary_camera_id is not None:
+        return
+    if followed_camera_id is None:
+        followed_camera_id = camera_id
+        print(f"[FreeD] No primary_camera_id configured; following camera {camera_id}")
+    if camera_id == followed_camera_id:
+        shared_camera.update_from_freed(pan_deg, tilt_deg, raw_zoom, t=arrival, focus=raw_focus)
         shared_camera.mark_freed_received()
 
-    except Exception as e:
-        print(f"❌ Failed to parse FreeD: {e}")
 
-def start_freed_listener(ip='0.0.0.0', port=19148):
-    def listen():
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-            sock.bind((ip, port))
-            print(f"[FreeD] Listening on {ip}:{port}")
+def apply_freed_packet(camera_id, packet, arrival=None):
+    _, pan_deg, tilt_deg, _, _, _, _, raw_zoom, raw_focus = packet
+    apply_freed_pose(camera_id, pan_deg, tilt_deg, raw_zoom, arrival, raw_focus)
+
+
+def parse_freed_packet(data, length=None, arrival=None):
+    packet = decode_d1(data, length=length)
+    if packet is None:
+        listener_stats.malformed += 1
+        return
+
+    apply_freed_packet(packet[0], packet, arrival)
+
+
+def apply_freed_batch(datagrams):
+    # One receive batch of (data, arrival), coalesced like the drain: only the newest pose per camera is applied.
+    pending = {}
+    for data, arrival in datagrams:
+        listener_stats.received += 1
+        packet = decode_d1(data)
+        if packet is None:
+            listener_stats.malformed += 1
+            continue
+        if packet[0] in pending:
+            listener_stats.coalesced += 1
+        pending[packet[0]] = (packet, arrival)
+    for camera_id, (packet, arrival) in pending.items():
+        apply_freed_packet(camera_id, packet, arrival)
+
+
+class FreeDDrain:
+    """Empties a non-blocking socket into a fixed ring and keeps the newest pose per camera."""
+
+    def __init__(self, sock, slots, stats=listener_stats):
+        self.sock = sock
+        self.slots = slots
+        self.stats = stats
+        self.ring = bytearray(slots * SLOT_SIZE)
+        view = memoryview(self.ring)
+        self.slot_views = [view[i * SLOT_SIZE:(i + 1) * SLOT_SIZE] for i in range(slots)]
+        self.lengths = np.zeros(slots, dtype=np.int32)
+        self.arrivals = np.zeros(slots)
+        self.decoded = np.empty(slots, dtype=D1_DTYPE)
+
+    def fill(self):
+        count = 0
+        recv_into = self.sock.recv_into
+        monotonic = time.monotonic
+        while count < self.slots:
+            try:
+                self.lengths[count] = recv_into(self.slot_views[count], SLOT_SIZE)
+            except (BlockingIOError, InterruptedError):
+                break
+            # Each datagram's own receive time; a batch can span several packet intervals.
+            self.arrivals[count] = monotonic()
+            count += 1
+        return count
+
+    def latest(self, count):
+        # The newest packet per camera and the arrival time of each.
+        packets = decode_d1_batch(self.ring, count, SLOT_SIZE, self.lengths, out=self.decoded)
+        valid = np.flatnonzero(packets["valid"])
+        self.stats.received += count
+        self.stats.malformed += count - len(valid)
+        if len(valid) == 0:
+            return packets[:0], self.arrivals[:0]
+
+        # np.unique on the reversed IDs finds the last occurrence of each camera.
+        cams = packets["camera_id"][valid][::-1]
+        _, first = np.unique(cams, return_index=True)
+        newest = valid[len(valid) - 1 - first]
+        newest.sort()
+        self.stats.coalesced += len(valid) - len(newest)
+        return packets[newest], self.arrivals[newest]
+
+
+def listen(ip, port, rcvbuf_bytes, ring_slots, stop=listener_stop):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf_bytes)
+        sock.bind((ip, port))
+        sock.setblocking(False)
+        actual = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        print(f"[FreeD] Listening on {ip}:{port} (SO_RCVBUF {actual} bytes, {ring_slots} slot ring)")
+
+        drain = FreeDDrain(sock, ring_slots)
+        batch = 0
+        listener_stats.refresh_kernel_drops(port, interval=0)
+        while not stop.is_set():
+            readable, _, _ = select.select([sock], [], [], 0.25)
+            listener_stats.refresh_kernel_drops(port)
+            if not readable:
+                continue
+
+            count = drain.fill()
+            if count == 0:
+                continue
+            batch += 1
+            capture = capture_writer
+            if capture is not None:
+                for i in range(count):
+                    capture.write(drain.slot_views[i][:drain.lengths[i]], float(drain.arrivals[i]), batch=batch)
+            packets, arrivals = drain.latest(count)
+            for packet, arrival in zip(packets, arrivals):
+                apply_freed_pose(int(packet["camera_id"]), float(packet["pan"]),
+                                 float(packet["tilt"]), int(packet["zoom"]), float(arrival), int(packet["focus"]))
+
+
+def configure_pipeline(config):
+    # Filter/calibration settings and primary-camera binding, shared by the live listener and replays.
+    global primary_camera_id, followed_camera_id
+    pose_filter.configure(**config["pose_filter"])
+    tilt_calibration.configure(**config["tilt_calibration"])
+
+    primary_camera_id = config["primary_camera_id"]
+    followed_camera_id = None
+    if primary_camera_id is not None:
+        camera_states[primary_camera_id] = shared_camera
+
+
+def capture_datagram(data, addr, arrival):
+    capture = capture_writer
+    service = freed_service
+    if capture is not None:
+        # Datagrams ingested before the same flush were coalesced together.
+        capture.write(data, arrival, addr, batch=service.flushes if service else None)
+
+
+def start_freed_listener(ip=None, port=None, rcvbuf_bytes=None, ring_slots=None, backend=None):
+    global listener_thread, freed_service, capture_writer
+    if listener_thread and listener_thread.is_alive():
+        return
+    if freed_service and freed_service.thread and freed_service.thread.is_alive():
+        return
+
+    config = load_freed_config()
+    explicit_endpoint = ip is not None or port is not None
+    ip = ip or config["ip"]
+    port = port or config["port"]
+    rcvbuf_bytes = rcvbuf_bytes or config["rcvbuf_bytes"]
+    ring_slots = ring_slots or config["ring_slots"]
+    backend = backend or config["backend"]
+
+    configure_pipeline(config)
+
+    if config["capture_path"]:
+        # Every datagram as received, for replaying set issues later (see freed_capture.py).
+        capture_writer = CaptureWriter(config["capture_path"])
+        print(f"[FreeD] Capturing datagrams to {config['capture_path']}")
+
+    if backend == "asyncio":
+        endpoints = [(ip, port)] if explicit_endpoint else (config["endpoints"] or [(ip, port)])
+        freed_service = FreeDIngestService(endpoints, on_pose=apply_freed_packet, rcvbuf_bytes=rcvbuf_bytes,
+                                           on_datagram=capture_datagram if capture_writer else None)
+        freed_service.start()
+        return
+
+    listener_stop.clear()
+    listener_thread = threading.Thread(target=listen, args=(ip, port, rcvbuf_bytes, ring_slots), daemon=True)
+    listener_thread.start()
 
-            while True:
-                data, _ = sock.recvfrom(1024)
-                parse_freed_packet(data)
 
-    thread = threading.Thread(target=listen, daemon=True)
-    thread.start()
+def stop_freed_listener():
+    global listener_thread, freed_service, capture_writer
+    if listener_thread:
+        # The drain wakes from select at least every 0.25 s and closes its socket on the way out.
+        listener_stop.set()
+        listener_thread.join(timeout=2.0)
+        listener_thread = None
+    if freed_service:
+        freed_service.stop()
+        freed_service = None
+    if capture_writer:
+        capture, capture_writer = capture_writer, None
+        capture.close()
@@ -0,0 +1,245 @@
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import socket
+import time
+import numpy as np
+from freed_protocol import D1_PACKET_SIZE, decode_d1, decode_d1_batch, encode_d1
+from latency_stats import LatencyHistogram
+
+# Synthetic FreeD load: N virtual camera heads sending valid D1 packets to a
+# local port, optionally with send jitter, duplicates and corrupt packets, and
+# a stress benchmark that runs freed_listener against it.
+#
+#   python freed_loadgen.py generate --cameras 8 --rate 60 --duration 30
+#   python freed_loadgen.py bench --cameras 32 --rate 250 --backend drain
+#
+# In a benchmark the generator tags each packet with a per-camera sequence
+# number in the focus field and records its send time in shared memory, so the
+# listener side can measure send → applied latency without a clock in the
+# packet. Sender and listener share the host's monotonic clock.
+
+SEQ_SPACE = 4096  # send-time slots per camera; wraps long before latency could
+
+
+class VirtualCamera:
+    """A head operated like a person would: slow pans, gentle tilt, occasional zoom moves, slight dolly drift."""
+
+    def __init__(self, camera_id, rng):
+        self.camera_id = camera_id
+        self.pan_amp = rng.uniform(20, 90)
+        self.pan_freq = rng.uniform(0.02, 0.15)
+        self.pan_phase = rng.uniform(0, 2 * math.pi)
+        self.tilt_amp = rng.uniform(2, 10)
+        self.tilt_freq = rng.uniform(0.05, 0.2)
+        self.zoom_freq = rng.uniform(0.01, 0.05)
+        self.x, self.y, self.z = rng.uniform(-3000, 3000), rng.uniform(-6000, -2000), rng.uniform(1200, 1800)
+        self.seq = 0
+
+    def packet(self, t, focus=None):
+        pan = self.pan_amp * math.sin(2 * math.pi * self.pan_freq * t + self.pan_phase)
+        # A second, faster component gives the small corrections an operator makes.
+        pan += 0.5 * math.sin(2 * math.pi * 1.3 * t + self.pan_phase)
+        tilt = self.tilt_amp * math.sin(2 * math.pi * self.tilt_freq * t)
+        zoom = int(0x200000 * (1 - math.cos(2 * math.pi * self.zoom_freq * t)))
+        x = self.x + 50 * math.sin(0.1 * t)
+        self.seq += 1
+        return encode_d1(self.camera_id, pan, tilt, 0.0, x, self.y, self.z, zoom,
+                         self.seq if focus is None else focus)
+
+
+def _corrupt(packet, rng):
+    damaged = bytearray(packet)
+    choice = rng.randrange(3)
+    if choice == 0:
+        damaged[-1] ^= 0xFF                           # bad checksum
+    elif choice == 1:
+        damaged = damaged[:rng.randrange(1, D1_PACKET_SIZE)]  # truncated
+    else:
+        damaged[rng.randrange(2, D1_PACKET_SIZE - 1)] ^= 0x5A  # flipped payload byte
+    return bytes(damaged)
+
+
+def generate(host="127.0.0.1", port=19148, cameras=4, rate=60.0, duration=10.0, jitter_ms=0.0,
+             duplicate=0.0, corrupt=0.0, seed=1, send_times=None, counters=None):
+    # Each camera sends at `rate` Hz on its own schedule; all heads are served from one socket in time order.
+    rng = random.Random(seed)
+    heads = [VirtualCamera(i + 1, rng) for i in range(cameras)]
+    interval = 1.0 / rate
+    due = [i * interval / cameras for i in range(cameras)]
+    sent = duplicates = corrupted = 0
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        start = time.monotonic()
+        while True:
+            index = min(range(cameras), key=due.__getitem__)
+            when = due[index] + (rng.uniform(-jitter_ms, jitter_ms) / 1000.0 if jitter_ms else 0.0)
+            if due[index] >= duration:
+                break
+            delay = start + when - time.monotonic()
+            if delay > 0.001:
+                time.sleep(delay - 0.0005)
+            while start + when > time.monotonic():
+                pass
+
+            head = heads[index]
+            # Tags run 1..SEQ_SPACE-1 so a focus of 0 always means "untagged".
+            tag = head.seq % (SEQ_SPACE - 1) + 1 if send_times is not None else None
+            packet = head.packet(due[index], tag)
+            if corrupt and rng.random() < corrupt:
+                packet = _corrupt(packet, rng)
+                corrupted += 1
+            elif tag is not None:
+                send_times[index * SEQ_SPACE + tag] = time.monotonic()
+            sock.sendto(packet, (host, port))
+            sent += 1
+            if duplicate and rng.random() < duplicate:
+                sock.sendto(packet, (host, port))
+                duplicates += 1
+            due[index] += interval
+
+    elapsed = time.monotonic() - start
+    if counters is not None:
+        counters[:] = [sent, duplicates, corrupted]
+    return sent, duplicates, corrupted, elapsed
+
+
+def parse_cost(iterations=100000):
+    # Pure decode cost per packet, without sockets: the scalar path and the batched ring path.
+    head = VirtualCamera(1, random.Random(0))
+    packet = head.packet(0.0)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        decode_d1(packet)
+    scalar = (time.perf_counter() - start) / iterations
+
+    slots = 256
+    ring = bytearray(packet.ljust(64, b"\0") * slots)
+    lengths = np.full(slots, D1_PACKET_SIZE, dtype=np.int32)
+    rounds = max(1, iterations // slots)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        decode_d1_batch(ring, slots, 64, lengths)
+    batch = (time.perf_counter() - start) / (rounds * slots)
+    return {"decode_d1_us": scalar * 1e6, "decode_d1_batch_us": batch * 1e6}
+
+
+def bench(cameras=8, rate=60.0, duration=10.0, backend="drain", port=29148, jitter_ms=0.0,
+          duplicate=0.0, corrupt=0.0, seed=1):
+    import freed_listener
+
+    send_times = multiprocessing.Array("d", cameras * SEQ_SPACE, lock=False)
+    counters = multiprocessing.Array("l", 3, lock=False)
+    send_to_apply = LatencyHistogram(bucket_ms=0.05, max_ms=200.0)
+    socket_wait = LatencyHistogram(bucket_ms=0.05, max_ms=200.0)
+    applied = [0]
+
+    # Instrument the listener's apply step; everything before it is the real listen/parse path.
+    apply_freed_pose = freed_listener.apply_freed_pose
+
+    def timed_apply(camera_id, pan_deg, tilt_deg, raw_zoom, arrival=None, raw_focus=0):
+        apply_freed_pose(camera_id, pan_deg, tilt_deg, raw_zoom, arrival, raw_focus)
+        now = time.monotonic()
+        applied[0] += 1
+        if 1 <= camera_id <= cameras and 0 < raw_focus < SEQ_SPACE:
+            sent = send_times[(camera_id - 1) * SEQ_SPACE + raw_focus]
+            if sent:
+                send_to_apply.add(now - sent)
+                if arrival is not None:
+                    socket_wait.add(arrival - sent)
+
+    freed_listener.apply_freed_pose = timed_apply
+    freed_listener.start_freed_listener(ip="127.0.0.1", port=port, backend=backend)
+    time.sleep(0.2)
+
+    stats = freed_listener.listener_stats
+    service = freed_listener.freed_service
+    cpu_start = time.process_time()
+    generator = multiprocessing.Process(
+        target=generate, args=("127.0.0.1", port, cameras, rate, duration, jitter_ms, duplicate, corrupt, seed),
+        kwargs={"send_times": send_times, "counters": counters})
+    wall_start = time.monotonic()
+    generator.start()
+    generator.join()
+    time.sleep(0.2)  # let the listener drain what's still queued
+    wall = time.monotonic() - wall_start
+    cpu = time.process_time() - cpu_start
+    freed_listener.stop_freed_listener()
+    freed_listener.apply_freed_pose = apply_freed_pose
+
+    sent, duplicates, corrupted = counters[:]
+    if service is not None:
+        received, malformed, coalesced, kernel_dropped = service.received, service.malformed, service.coalesced, None
+    else:
+        stats.refresh_kernel_drops(port, interval=0)
+        received, malformed, coalesced, kernel_dropped = stats.received, stats.malformed, stats.coalesced, \
+            stats.kernel_dropped
+    datagrams = sent + duplicates
+    return {
+        "backend": backend,
+        "cameras": cameras,
+        "rate_hz": rate,
+        "offered_pps": cameras * rate,
+        "duration_s": duration,
+        "sent": datagrams,
+        "duplicates": duplicates,
+        "corrupt_sent": corrupted,
+        "received": received,
+        "received_pps": received / wall if wall else 0.0,
+        "malformed": malformed,
+        "coalesced": coalesced,
+        "applied": applied[0],
+        "lost": datagrams - received,
+        "loss_ratio": (datagrams - received) / datagrams if datagrams else 0.0,
+        "kernel_dropped": kernel_dropped,
+        "ingest_cpu_us_per_packet": cpu / received * 1e6 if received else None,
+        "ingest_cpu_fraction": cpu / wall if wall else 0.0,
+        "socket_wait_ms": socket_wait.summary(),
+        "send_to_apply_ms": send_to_apply.summary(),
+        "parse": parse_cost(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic FreeD load generator and listener benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("generate", "send synthetic D1 packets"), ("bench", "stress the listener")):
+        sub = commands.add_parser(name, help=help_text)
+        sub.add_argument("--cameras", type=int, default=4, help="virtual camera heads (IDs 1..N)")
+        sub.add_argument("--rate", type=float, default=60.0, help="packets per second per camera")
+        sub.add_argument("--duration", type=float, default=10.0, help="seconds")
+        sub.add_argument("--jitter-ms", type=float, default=0.0, help="uniform send-time jitter")
+        sub.add_argument("--duplicate", type=float, default=0.0, help="probability a packet is sent twice")
+        sub.add_argument("--corrupt", type=float, default=0.0, help="probability a packet is damaged")
+        sub.add_argument("--seed", type=int, default=1)
+    commands.choices["generate"].add_argument("--host", default="127.0.0.1")
+    commands.choices["generate"].add_argument("--port", type=int, default=19148)
+    commands.choices["bench"].add_argument("--port", type=int, default=29148, help="local port to listen on")
+    commands.choices["bench"].add_argument("--backend", choices=("drain", "asyncio"), default="drain")
+    commands.choices["bench"].add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if args.cameras < 1 or args.cameras > 255:
+        parser.error("--cameras must be between 1 and 255")
+
+    if args.command == "generate":
+        print(f"[LoadGen] {args.cameras} cameras × {args.rate:g} Hz → {args.host}:{args.port} for {args.duration:g}s")
+        sent, duplicates, corrupted, elapsed = generate(args.host, args.port, args.cameras, args.rate, args.duration,
+                                                        args.jitter_ms, args.duplicate, args.corrupt, args.seed)
+        print(f"[LoadGen] Sent {sent + duplicates} datagrams ({duplicates} duplicates, {corrupted} corrupt) "
+              f"in {elapsed:.2f}s = {(sent + duplicates) / elapsed:.0f} pps")
+        return
+
+    report = bench(args.cameras, args.rate, args.duration, args.backend, args.port, args.jitter_ms,
+                   args.duplicate, args.corrupt, args.seed)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
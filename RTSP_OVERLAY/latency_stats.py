@@ -0,0 +1,84 @@
+import time
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram: O(1) add, percentiles from a cumulative scan."""
+
+    def __init__(self, bucket_ms=0.25, max_ms=500.0):
+        self.bucket_ms = bucket_ms
+        self.counts = [0] * (int(max_ms / bucket_ms) + 1)
+        self.count = 0
+        self.max_ms = 0.0
+
+    def add(self, seconds):
+        ms = seconds * 1000.0
+        index = int(ms / self.bucket_ms)
+        if index < 0:
+            index = 0
+        elif index >= len(self.counts):
+            index = len(self.counts) - 1
+        self.counts[index] += 1
+        self.count += 1
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+        target = q / 100.0 * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return (index + 0.5) * self.bucket_ms
+        return self.max_ms
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max_ms,
+        }
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.max_ms = 0.0
+
+
+class LatencyMonitor:
+    """Tracks packet-arrival → pose-applied and packet-arrival → frame-presented latency."""
+
+    def __init__(self, dump_interval=10.0):
+        self.apply = LatencyHistogram()
+        self.present = LatencyHistogram()
+        self.dump_interval = dump_interval
+        self._last_dump = time.monotonic()
+
+    def record_apply(self, arrival, now=None):
+        self.apply.add((now or time.monotonic()) - arrival)
+
+    def record_present(self, arrival, now=None):
+        self.present.add((now or time.monotonic()) - arrival)
+
+    def format(self):
+        lines = []
+        for name, hist in (("arrival→apply", self.apply), ("arrival→present", self.present)):
+            s = hist.summary()
+            lines.append(f"{name}: p50 {s['p50']:.1f}  p95 {s['p95']:.1f}  p99 {s['p99']:.1f} ms  (n={s['count']})")
+        return "\n".join(lines)
+
+    def maybe_dump(self, now=None):
+        # Print and start a fresh window every dump_interval seconds (0 disables).
+        now = now or time.monotonic()
+        if not self.dump_interval or now - self._last_dump < self.dump_interval:
+            return False
+        self._last_dump = now
+        if self.present.count or self.apply.count:
+            for line in self.format().splitlines():
+                print(f"[Latency] {line}")
+        self.apply.reset()
+        self.present.reset()
+        return True
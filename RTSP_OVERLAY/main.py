@@ -1,5 +1,44 @@
+import argparse
+import sys
 from scene_manager import ViewerApp
+import render_benchmark
+
+parser = argparse.ArgumentParser(description="FreeD Virtual Viewer")
+parser.add_argument("--multiview", action="store_true",
+                    help="render every camera in config/cameras.json in its own display region")
+parser.add_argument("--offscreen", action="store_true",
+                    help="render to an offscreen buffer with the software renderer (no window or GPU)")
+parser.add_argument("--gpu", action="store_true", help="with --offscreen, use the default GPU pipe instead")
+parser.add_argument("--size", default="1280x720", help="offscreen buffer size, WIDTHxHEIGHT")
+parser.add_argument("--benchmark", action="store_true",
+                    help="render a fixed camera path, print timing/memory JSON and exit")
+parser.add_argument("--frames", type=int, default=600, help="benchmark frames (after warm-up)")
+parser.add_argument("--warmup", type=int, default=30, help="benchmark frames discarded before measuring")
+parser.add_argument("--trace", help="CSV pose trace (pan,tilt,zoom[,x,y,z,focus]) instead of the built-in script")
+parser.add_argument("--benchmark-out", help="write the benchmark JSON here instead of stdout")
+parser.add_argument("--record", metavar="TARGET",
+                    help="record the program output to a file or stream it to an rtsp:// or udp:// URL")
+parser.add_argument("--max-p95-ms", type=float,
+                    help="exit with status 1 if the 95th percentile frame time exceeds this")
+args = parser.parse_args()
+
+if args.offscreen:
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    render_benchmark.configure_offscreen(width, height, software=not args.gpu)
 
 print("Starting FreeD Virtual Viewer...")
-app = ViewerApp()
-app.run()
+app = ViewerApp(multiview=args.multiview, record=args.record)
+
+if not args.benchmark:
+    app.run()
+else:
+    total = args.frames + args.warmup
+    poses = render_benchmark.trace_poses(args.trace, total) if args.trace \
+        else render_benchmark.scripted_poses(total)
+    report = render_benchmark.run_benchmark(app, poses, warmup=args.warmup)
+    report["pose_source"] = args.trace or "script"
+    render_benchmark.write_report(report, args.benchmark_out)
+    if args.max_p95_ms is not None and report["frame_ms"]["p95"] > args.max_p95_ms:
+        print(f"[Benchmark] p95 frame time {report['frame_ms']['p95']:.2f} ms exceeds {args.max_p95_ms} ms")
+        sys.exit(1)
+    app.destroy()
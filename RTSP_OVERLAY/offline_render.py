@@ -0,0 +1,201 @@
+import argparse
+import math
+import multiprocessing
+import os
+import shutil
+import subprocess
+import time
+import cv2
+import numpy as np
+import render_benchmark
+from render_benchmark import BenchmarkPose, read_trace
+
+# Offline renderer: turn a recorded pose trace into an image sequence or a
+# video, headless and in parallel. The trace is split into time ranges that
+# worker processes render with their own offscreen ViewerApp, each loading the
+# scene once, so output matches the live viewer's scene, lighting and
+# camera/lens mapping.
+#
+#   python offline_render.py session.fdcap -o renders/frame_%06d.png --workers 8
+#   python offline_render.py poses.csv -o show.mp4 --fps 30 --size 1920x1080 --gpu
+#
+# A .fdcap capture goes through the listener's pose pipeline on a virtual
+# clock (see freed_capture.py simulate) and is sampled at --fps, with the same
+# prediction and idle sway as live. A CSV trace is one pose per frame.
+# Video output is rendered as one segment per time range and joined at the
+# end: stream-copied by ffmpeg when it is on PATH, re-encoded otherwise.
+
+CHUNKS_PER_WORKER = 4  # more ranges than workers keeps every process busy until the end
+MIN_CHUNK_FRAMES = 30
+
+_app = None
+_frame = None
+
+
+def capture_poses(path, fps):
+    from camera_state import idle_pose, shared_camera
+    from freed_capture import CaptureReader, simulate
+    import pose_filter
+
+    latency = pose_filter.settings["latency_ms"] / 1000.0
+    poses = []
+
+    def frame(now):
+        pose = shared_camera.snapshot()
+        pan, tilt, zoom = shared_camera.predict(at=now + latency, pose=pose)
+        if shared_camera.should_idle():
+            pan, tilt = idle_pose(shared_camera.clock() - shared_camera.last_idle_start)
+        poses.append(BenchmarkPose(pose.x, pose.y, pose.z, pan, tilt, zoom, pose.focus))
+
+    reader = CaptureReader(path)
+    simulate(reader, frame, 1.0 / fps)
+    reader.close()
+    return poses
+
+
+def load_poses(path, fps):
+    return capture_poses(path, fps) if path.lower().endswith(".fdcap") else read_trace(path)
+
+
+def split(total, workers, min_frames=MIN_CHUNK_FRAMES):
+    # Contiguous (first, end) frame ranges.
+    size = max(min_frames, math.ceil(total / max(1, workers * CHUNKS_PER_WORKER)))
+    return [(first, min(first + size, total)) for first in range(0, total, size)]
+
+
+def _init_worker(width, height, software, scene, lock):
+    global _app, _frame
+    from panda3d.core import GraphicsOutput, Texture
+    from scene_manager import ViewerApp
+    # After the import: scene_manager sets its own window size.
+    render_benchmark.configure_offscreen(width, height, software)
+    # One process at a time, so only the first converts an uncached scene.
+    with lock:
+        _app = ViewerApp(offline=True)
+        if scene and scene != _app.scenes.active:
+            _app.scenes.load_now(scene)
+            _app.scenes.activate(scene)
+    # Program output only: no GUI, HUD or talent card.
+    _app.render2d.hide()
+    _frame = Texture("offline_frame")
+    _app.win.addRenderTexture(_frame, GraphicsOutput.RTM_copy_ram)
+
+
+def _render_range(job):
+    from program_output import open_encoder
+    from tracked_views import apply_tracked_pose
+
+    index, first, poses, pattern, segment, fps, encoder = job
+    app = _app
+    start = time.perf_counter()
+    writer = bgr = flipped = None
+    for i, pose in enumerate(poses):
+        apply_tracked_pose(app.camera, app.camLens, pose.x, pose.y, pose.z, pose.pan, pose.tilt, pose.zoom,
+                           app.lens_mapping, pose.focus)
+        app.graphicsEngine.renderFrame()
+        # BGR(A), rows bottom-up.
+        image = np.frombuffer(memoryview(_frame.getRamImage()), np.uint8).reshape(
+            _frame.getYSize(), _frame.getXSize(), _frame.getNumComponents())
+        if segment:
+            if writer is None:
+                writer = open_encoder(segment, image.shape[1], image.shape[0], fps, image.shape[2], encoder)
+            writer.write(image)
+            continue
+        if bgr is None:
+            bgr = np.empty(image.shape[:2] + (3,), np.uint8)
+            flipped = np.empty_like(bgr)
+        if image.shape[2] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR, dst=bgr)
+        cv2.flip(image, 0, dst=flipped)
+        cv2.imwrite(pattern % (first + i), flipped)
+    if writer:
+        writer.close()
+    return index, len(poses), time.perf_counter() - start
+
+
+def join_segments(segments, target, fps):
+    if shutil.which("ffmpeg"):
+        listing = target + ".segments.txt"
+        with open(listing, "w") as f:
+            for path in segments:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        subprocess.run(["ffmpeg", "-loglevel", "error", "-y", "-f", "concat", "-safe", "0", "-i", listing,
+                        "-c", "copy", target], check=True)
+        os.remove(listing)
+    else:
+        from program_output import OpenCVEncoder
+        writer = None
+        for path in segments:
+            cap = cv2.VideoCapture(path)
+            while True:
+                ok, image = cap.read()
+                if not ok:
+                    break
+                if writer is None:
+                    writer = OpenCVEncoder(target, image.shape[1], image.shape[0], fps, 3)
+                # OpenCVEncoder expects bottom-up rows, as read back from Panda3D.
+                writer.write(cv2.flip(image, 0))
+            cap.release()
+        if writer:
+            writer.close()
+    for path in segments:
+        os.remove(path)
+
+
+def render(poses, output, fps=30.0, size=(1280, 720), workers=None, software=True, scene=None,
+           encoder="auto"):
+    workers = workers or os.cpu_count() or 1
+    ranges = split(len(poses), workers)
+    workers = min(workers, len(ranges))
+    pattern = output if "%" in output else None
+    if pattern and os.path.dirname(pattern):
+        os.makedirs(os.path.dirname(pattern), exist_ok=True)
+    stem, extension = os.path.splitext(output)
+    jobs = [(i, first, poses[first:end], pattern, None if pattern else f"{stem}.part{i:04d}{extension}",
+             fps, encoder) for i, (first, end) in enumerate(ranges)]
+
+    print(f"[Offline] {len(poses)} frames ({len(poses) / fps:.1f}s) in {len(ranges)} ranges "
+          f"on {workers} worker(s) → {output}")
+    context = multiprocessing.get_context("spawn")
+    lock = context.Lock()
+    start = time.monotonic()
+    done = 0
+    with context.Pool(workers, _init_worker, (size[0], size[1], software, scene, lock)) as pool:
+        for index, frames, seconds in pool.imap_unordered(_render_range, jobs):
+            done += frames
+            print(f"[Offline] range {index + 1}/{len(jobs)}: {frames} frames at {frames / seconds:.1f} fps "
+                  f"({done}/{len(poses)})")
+    if not pattern:
+        join_segments([job[4] for job in jobs], output, fps)
+    elapsed = time.monotonic() - start
+    print(f"[Offline] Rendered {len(poses)} frames in {elapsed:.1f}s "
+          f"({len(poses) / fps / elapsed:.2f}× real time)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a recorded pose trace offline, in parallel")
+    parser.add_argument("trace", help=".fdcap capture or CSV pose trace (pan,tilt,zoom[,x,y,z,focus])")
+    parser.add_argument("-o", "--output", required=True,
+                        help="video file, or an image pattern with a frame number field like frames/%%06d.png")
+    parser.add_argument("--fps", type=float, default=30.0, help="output frame rate (and .fdcap sampling rate)")
+    parser.add_argument("--size", default="1280x720", help="WIDTHxHEIGHT")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--gpu", action="store_true", help="use the default GPU pipe instead of the software renderer")
+    parser.add_argument("--scene", help="scene name from config/scenes.json (default: the viewer's initial scene)")
+    parser.add_argument("--start", type=float, default=0.0, help="first second of the trace to render")
+    parser.add_argument("--end", type=float, help="last second of the trace to render")
+    parser.add_argument("--encoder", default="auto", choices=["auto", "opencv", "ffmpeg"])
+    args = parser.parse_args()
+
+    poses = load_poses(args.trace, args.fps)
+    last = len(poses) if args.end is None else int(args.end * args.fps)
+    poses = poses[int(args.start * args.fps):last]
+    if not poses:
+        parser.error("no frames in the selected range")
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    render(poses, args.output, args.fps, (width, height), args.workers, not args.gpu, args.scene, args.encoder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import cv2
+import numpy as np
+from panda3d.core import CardMaker, Texture, TransparencyAttrib, TextureStage
+
+# Keys the talent ROI of a video frame straight into a texture's RAM image and
+# places a card for it, with no per-frame image allocations:
+#   - every OpenCV step writes into the texture or a preallocated scratch
+#     buffer through dst=, and the crop is a view of the frame;
+#   - Panda3D stores RGBA8 as BGRA, which is OpenCV's order already, so there
+#     is no channel swizzle;
+#   - rows stay top-down and the card's V coordinates are flipped instead;
+#   - the texture is only as large as the ROI (rounded up to TILE) and the
+#     card is scaled on screen, so nothing is resized or padded on the CPU.
+#
+# The mask itself is estimated at 1/MASK_STEP resolution and kept between
+# frames. While the ROI holds still, only the part of the low-resolution mask
+# that changed is upsampled again, and only the edge tiles inside it are
+# re-keyed at full resolution, so keying cost follows the talent's motion,
+# not ROI size.
+
+TILE = 64
+MASK_STEP = 4       # the mask is estimated at 1/MASK_STEP resolution
+REUSE_PX = 4        # ROI moves up to this far keep the previous mask and mode
+MODE_INTERVAL = 30  # re-decide green vs. luma keying at least this often (frames)
+EDGE_TILE = 16      # low-resolution pixels per side of a re-keyed edge tile
+LOWER_GREEN = np.array([35, 40, 40], dtype=np.uint8)
+UPPER_GREEN = np.array([85, 255, 255], dtype=np.uint8)
+CALIBRATION_MIN_FRACTION = 0.05  # backdrop share of the ROI needed to calibrate
+CALIBRATION_HUE_MARGIN = 4
+CALIBRATION_SV_MARGIN = 20
+
+
+def _round_up(value, step=TILE):
+    return -(-value // step) * step
+
+
+class TalentCompositor:
+    def __init__(self, parent, height_fraction=0.5):
+        self.height_fraction = height_fraction
+        self.texture = Texture("talent")
+        self.texture.setMinfilter(Texture.FT_linear)
+        self.texture.setMagfilter(Texture.FT_linear)
+        self.texture.setWrapU(Texture.WM_clamp)
+        self.texture.setWrapV(Texture.WM_clamp)
+        self.capacity = (0, 0)
+        self.scratch = None
+        self.small = None
+
+        # Key colour range, calibrated once per session from the first frames showing the backdrop.
+        self.key_range = (LOWER_GREEN, UPPER_GREEN)
+        self.calibrated = False
+        self.mode = None
+        self.mode_age = 0
+        self.roi = None
+        self.refined = 0.0  # fraction of the ROI re-keyed at full resolution last frame
+
+        cm = CardMaker("talent_card")
+        cm.setFrame(-1, 1, -1, 1)
+        # Image rows are uploaded top-down, so the top of the card samples v = 0.
+        cm.setUvRange((0, 1), (1, 0))
+        self.card = parent.attachNewNode(cm.generate())
+        self.card.setTransparency(TransparencyAttrib.MAlpha)
+        self.card.setTexture(self.texture)
+        self.card.hide()
+
+    def _ensure_capacity(self, width, height):
+        cap_w, cap_h = self.capacity
+        if width <= cap_w and height <= cap_h and width * height * 2 > cap_w * cap_h:
+            return
+        cap_w, cap_h = _round_up(width), _round_up(height)
+        self.texture.setup2dTexture(cap_w, cap_h, Texture.T_unsigned_byte, Texture.F_rgba)
+        self.texture.setRamImage(bytes(cap_w * cap_h * 4))
+        self.capacity = (cap_w, cap_h)
+        # HSV, mask, edge band and the persistent alpha plane, reused for every ROI up to this size.
+        self.scratch = (np.empty((cap_h, cap_w, 3), np.uint8), np.empty((cap_h, cap_w), np.uint8),
+                        np.empty((cap_h, cap_w), np.uint8), np.zeros((cap_h, cap_w), np.uint8))
+        small_w, small_h = -(-cap_w // MASK_STEP), -(-cap_h // MASK_STEP)
+        # Low-resolution BGR, HSV, mask, alpha, previous alpha and difference/edge planes.
+        self.small = (np.empty((small_h, small_w, 3), np.uint8), np.empty((small_h, small_w, 3), np.uint8),
+                      np.empty((small_h, small_w), np.uint8), np.empty((small_h, small_w), np.uint8),
+                      np.zeros((small_h, small_w), np.uint8), np.empty((small_h, small_w), np.uint8))
+        self.roi = None
+
+    def recalibrate(self):
+        self.calibrated = False
+        self.key_range = (LOWER_GREEN, UPPER_GREEN)
+        self.roi = None
+        print("[Keyer] Key colour calibration reset")
+
+    def _calibrate(self, hsv):
+        # Fit the key range to the backdrop actually in view; needs a decent share of green to trust it.
+        loose = cv2.inRange(hsv, LOWER_GREEN, UPPER_GREEN)
+        backdrop = hsv[loose > 0]
+        if len(backdrop) < CALIBRATION_MIN_FRACTION * loose.size:
+            return
+        lo = np.percentile(backdrop, 2, axis=0)
+        hi = np.percentile(backdrop, 98, axis=0)
+        lower = (max(0, lo[0] - CALIBRATION_HUE_MARGIN), max(LOWER_GREEN[1], lo[1] - CALIBRATION_SV_MARGIN),
+                 max(LOWER_GREEN[2], lo[2] - CALIBRATION_SV_MARGIN))
+        upper = (min(179, hi[0] + CALIBRATION_HUE_MARGIN), 255, 255)
+        self.key_range = (np.array(lower, np.uint8), np.array(upper, np.uint8))
+        self.calibrated = True
+        print(f"[Keyer] Calibrated key colour: H {lower[0]:.0f}-{upper[0]:.0f}, "
+              f"S >= {lower[1]:.0f}, V >= {lower[2]:.0f}")
+
+    def _key_full(self, crop, out, hsv):
+        # Full-resolution hard key of `crop` into `out` (255 = talent).
+        if self.mode == "green":
+            cv2.cvtColor(crop, cv2.COLOR_BGR2HSV, dst=hsv)
+            cv2.inRange(hsv, *self.key_range, dst=out)
+            cv2.bitwise_not(out, dst=out)
+        else:
+            cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY, dst=out)
+            cv2.threshold(out, 50, 255, cv2.THRESH_BINARY, dst=out)
+
+    def key(self, crop, bgra, reuse=False):
+        h, w = crop.shape[:2]
+        sw, sh = -(-w // MASK_STEP), -(-h // MASK_STEP)
+        small_bgr, small_hsv, small_mask, small_alpha, prev_alpha, diff = (
+            plane[:sh, :sw] for plane in self.small)
+        # Bilinear is ~15x cheaper than INTER_AREA here and averages enough noise for a mask estimate.
+        cv2.resize(crop, (sw, sh), dst=small_bgr, interpolation=cv2.INTER_LINEAR)
+        cv2.cvtColor(small_bgr, cv2.COLOR_BGR2HSV, dst=small_hsv)
+        if not self.calibrated:
+            self._calibrate(small_hsv)
+        cv2.inRange(small_hsv, *self.key_range, dst=small_mask)
+
+        self.mode_age += 1
+        if not reuse or self.mode is None or self.mode_age >= MODE_INTERVAL:
+            # No green screen behind the talent means a luma key.
+            mode = "green" if cv2.mean(small_mask)[0] >= 5 else "luma"
+            reuse = reuse and mode == self.mode
+            self.mode, self.mode_age = mode, 0
+        if self.mode == "green":
+            cv2.bitwise_not(small_mask, dst=small_alpha)
+        else:
+            cv2.cvtColor(small_bgr, cv2.COLOR_BGR2GRAY, dst=small_mask)
+            cv2.threshold(small_mask, 50, 255, cv2.THRESH_BINARY, dst=small_alpha)
+
+        # Only the part of the mask that changed since the last frame is rebuilt.
+        if reuse:
+            cv2.absdiff(small_alpha, prev_alpha, dst=diff)
+            x, y, rw, rh = cv2.boundingRect(diff)
+            region = (max(0, x - 1), max(0, y - 1), min(sw, x + rw + 1), min(sh, y + rh + 1)) if rw else None
+        else:
+            region = (0, 0, sw, sh)
+        np.copyto(prev_alpha, small_alpha)
+
+        hsv, mask, band, alpha = (plane[:h, :w] for plane in self.scratch)
+        self.refined = 0.0
+        if region:
+            sx0, sy0, sx1, sy1 = region
+            x0, y0 = sx0 * w // sw, sy0 * h // sh
+            x1, y1 = sx1 * w // sw, sy1 * h // sh
+            cv2.resize(small_alpha[sy0:sy1, sx0:sx1], (x1 - x0, y1 - y0), dst=alpha[y0:y1, x0:x1],
+                       interpolation=cv2.INTER_LINEAR)
+
+            # Upsampling leaves a soft ramp wherever neighbouring mask pixels differ; find those
+            # tiles at low resolution and re-key only their ramp pixels at full resolution.
+            edges = diff[sy0:sy1, sx0:sx1]
+            cv2.morphologyEx(small_alpha[sy0:sy1, sx0:sx1], cv2.MORPH_GRADIENT, None, dst=edges)
+            rows = np.arange(0, sy1 - sy0, EDGE_TILE)
+            cols = np.arange(0, sx1 - sx0, EDGE_TILE)
+            tiles = np.add.reduceat(np.add.reduceat(edges, rows, axis=0, dtype=np.uint32), cols, axis=1)
+            refined = 0
+            for ty, tx in zip(*np.nonzero(tiles)):
+                ta, tb = sx0 + cols[tx], sy0 + rows[ty]
+                tx0, ty0 = ta * w // sw, tb * h // sh
+                tx1, ty1 = min(ta + EDGE_TILE, sx1) * w // sw, min(tb + EDGE_TILE, sy1) * h // sh
+                up, ramp, full = (plane[ty0:ty1, tx0:tx1] for plane in (alpha, band, mask))
+                cv2.inRange(up, 1, 254, dst=ramp)
+                self._key_full(crop[ty0:ty1, tx0:tx1], full, hsv[ty0:ty1, tx0:tx1])
+                cv2.copyTo(full, ramp, up)
+                refined += (tx1 - tx0) * (ty1 - ty0)
+            self.refined = refined / (w * h)
+
+        cv2.cvtColor(crop, cv2.COLOR_BGR2BGRA, dst=bgra)
+        np.copyto(bgra[:, :, 3], alpha)
+
+    def composite(self, frame, bbox, win_w, win_h):
+        x1, y1, x2, y2 = bbox
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(frame.shape[1], x2), min(frame.shape[0], y2)
+        if x2 <= x1 or y2 <= y1:
+            return False
+        w, h = x2 - x1, y2 - y1
+        self._ensure_capacity(w, h)
+        cap_w, cap_h = self.capacity
+
+        # A ROI that kept its size and barely moved can build on the previous frame's mask.
+        roi = self.roi
+        reuse = (roi is not None and roi[2:] == (w, h) and
+                 abs(x1 - roi[0]) <= REUSE_PX and abs(y1 - roi[1]) <= REUSE_PX)
+        self.roi = (x1, y1, w, h)
+
+        # Key directly into the texture's RAM image; modifyRamImage also marks it for re-upload.
+        ram = np.frombuffer(memoryview(self.texture.modifyRamImage()), np.uint8).reshape(cap_h, cap_w, 4)
+        self.key(frame[y1:y2, x1:x2], ram[:h, :w], reuse)
+
+        # Sample only the ROI corner of the texture; size the card like the old half-height canvas.
+        self.card.setTexScale(TextureStage.getDefault(), w / cap_w, h / cap_h)
+        card_h = self.height_fraction
+        card_w = card_h * (w / h) * (win_h / win_w)
+        self.card.setScale(card_w, 1, card_h)
+        self.card.show()
+        return True
+
+    def format(self):
+        mode = self.mode or "-"
+        calibration = "calibrated" if self.calibrated else "default range"
+        return f"keyer: {mode} ({calibration})  re-keyed {self.refined:.0%} of ROI  (k: recalibrate)"
+
+    def destroy(self):
+        self.card.removeNode()
@@ -0,0 +1,22 @@
+import json
+import os
+
+CONFIG_PATH = os.path.join("config", "overlay.json")
+DEFAULT_CONFIG = {
+    # BBoxPoller keyword arguments: poll_hz, timeout, stale_after
+    "bbox": {},
+    # RTSPStream keyword arguments: low_latency, transport, max_drain, decode_scale, pool_size
+    "video": {},
+    # VideoSync keyword arguments: enabled, video_delay_ms, auto_estimate, max_delay_ms, ...
+    "sync": {},
+    # ProgramOutput keyword arguments: target (file path or rtsp://, udp:// URL), fps, queue_size, encoder
+    "output": {},
+}
+
+
+def load_overlay_config(path=CONFIG_PATH):
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(path):
+        with open(path) as f:
+            config.update(json.load(f))
+    return config
@@ -0,0 +1,60 @@
+DEFAULT_SETTINGS = {
+    "alpha": 0.6,                  # Position gain: 1.0 trusts every sample, lower smooths more
+    "beta": 0.08,                  # Velocity gain
+    "tele_gain": 0.35,             # Gain multiplier at full zoom, where jitter is magnified
+    "latency_ms": 33.0,            # Render this far ahead of the newest sample
+    "max_extrapolation_ms": 100.0, # Never extrapolate further than this past a sample
+    "reset_gap_ms": 500.0,         # Re-seed the filter after a dropout this long
+    "min_dt_ms": 2.0,              # Closer samples only correct the position, never the rate
+}
+
+settings = dict(DEFAULT_SETTINGS)
+
+
+def configure(**overrides):
+    unknown = set(overrides) - set(DEFAULT_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown pose filter setting(s): {', '.join(sorted(unknown))}")
+    settings.update(overrides)
+
+
+class AlphaBetaFilter:
+    """Constant-velocity (steady-state Kalman) filter for one axis with irregular sample times."""
+
+    __slots__ = ("value", "rate", "t", "wrap")
+
+    def __init__(self, wrap=None):
+        self.value = 0.0
+        self.rate = 0.0
+        self.t = None
+        self.wrap = wrap
+
+    def reset(self, value, t):
+        self.value = value
+        self.rate = 0.0
+        self.t = t
+
+    def update(self, measured, t, alpha, beta):
+        if self.t is None or (t - self.t) * 1000.0 > settings["reset_gap_ms"]:
+            self.reset(measured, t)
+            return
+
+        dt = t - self.t
+        predicted = self.value + self.rate * max(dt, 0.0)
+        residual = measured - predicted
+        if self.wrap:
+            half = self.wrap / 2
+            residual = (residual + half) % self.wrap - half
+
+        self.value = predicted + alpha * residual
+        # Over a near-zero dt the residual is jitter, and dividing by dt would blow it up into the rate.
+        if dt * 1000.0 >= settings["min_dt_ms"]:
+            self.rate += beta * residual / dt
+        self.t = max(t, self.t)
+
+
+def extrapolate(value, rate, sample_time, at):
+    dt = at - sample_time
+    if dt <= 0:
+        return value
+    return value + rate * min(dt, settings["max_extrapolation_ms"] / 1000.0)
@@ -0,0 +1,93 @@
+from pose_filter import extrapolate
+
+HISTORY_SIZE = 1024  # ~17 s of FreeD at 60 Hz
+# Slots at the old end of the ring the writer may be overwriting while a reader searches.
+GUARD = 16
+
+
+def _lerp(a, b, f):
+    return a + (b - a) * f
+
+
+class PoseHistory:
+    """Ring buffer of published CameraPose snapshots, searchable by sample time.
+
+    The listener thread appends and readers on the render thread search
+    without a lock: slots are indexed by pose.seq, so a slot overwritten
+    mid-search shows up as a seq mismatch and is treated as too old.
+    """
+
+    def __init__(self, size=HISTORY_SIZE):
+        self.size = size
+        self.slots = [None] * size
+        self.newest = None
+
+    def append(self, pose):
+        self.slots[pose.seq % self.size] = pose
+        self.newest = pose
+
+    def _get(self, seq):
+        pose = self.slots[seq % self.size]
+        return pose if pose is not None and pose.seq == seq else None
+
+    def find(self, t):
+        # (newest pose at or before t, the one after it); after is None past the newest sample.
+        newest = self.newest
+        if newest is None or t >= newest.t:
+            return newest, None
+        lo = max(newest.seq - self.size + GUARD, 0)
+        hi = newest.seq
+        oldest = self._get(lo)
+        while oldest is None and lo < hi:
+            lo += 1
+            oldest = self._get(lo)
+        if oldest is None or t < oldest.t:
+            return None, oldest
+        # Invariant: slot lo is at or before t, slot hi is after it.
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            pose = self._get(mid)
+            if pose is not None and pose.t <= t:
+                lo = mid
+            else:
+                hi = mid
+        return self._get(lo), self._get(hi)
+
+    def sample(self, t):
+        """The pose at time t: interpolated between samples, extrapolated past the newest."""
+        before, after = self.find(t)
+        if before is None:
+            return after
+        if after is None:
+            return before._replace(
+                pan=extrapolate(before.pan, before.pan_rate, before.t, t),
+                tilt=extrapolate(before.tilt, before.tilt_rate, before.t, t),
+                zoom=extrapolate(before.zoom, before.zoom_rate, before.t, t),
+                t=t)
+        span = after.t - before.t
+        f = (t - before.t) / span if span > 0 else 1.0
+        # Filtered pan is continuous (never wrapped), so a plain lerp is safe.
+        nearest = after if f >= 0.5 else before
+        return nearest._replace(
+            pan=_lerp(before.pan, after.pan, f), tilt=_lerp(before.tilt, after.tilt, f),
+            zoom=_lerp(before.zoom, after.zoom, f), t=t,
+            pan_rate=_lerp(before.pan_rate, after.pan_rate, f),
+            tilt_rate=_lerp(before.tilt_rate, after.tilt_rate, f),
+            zoom_rate=_lerp(before.zoom_rate, after.zoom_rate, f))
+
+    def since(self, t):
+        """Poses sampled at or after t, oldest first."""
+        newest = self.newest
+        if newest is None:
+            return []
+        poses = []
+        seq = newest.seq
+        stop = max(newest.seq - self.size + GUARD, 0)
+        while seq >= stop:
+            pose = self._get(seq)
+            if pose is None or pose.t < t:
+                break
+            poses.append(pose)
+            seq -= 1
+        poses.reverse()
+        return poses
@@ -0,0 +1,238 @@
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import cv2
+import numpy as np
+from panda3d.core import GraphicsOutput, Texture
+
+# Records or streams what the window shows without stalling the render loop.
+#
+# A small pool of textures takes turns as the window's triggered RAM-copy
+# target: the copy is only requested on frames due at the output rate, and
+# each copy lands in a texture nobody is reading, so the render thread never
+# waits for the encoder. Filled textures go through a bounded queue to an
+# encoder thread, which hands each one back once written. When the encoder
+# falls behind, the pool runs dry and frames are dropped and counted rather
+# than queued. The encoder repeats the previous frame over any gaps so the
+# output keeps real-time pacing.
+#
+# Panda3D 1.10 has no asynchronous readback; the triggered copy is a plain
+# framebuffer read, so the cost on the render thread is one read per output
+# frame and none on the frames in between.
+
+DEFAULT_FPS = 30.0
+DEFAULT_QUEUE = 3
+
+
+def _ffmpeg_command(target, width, height, fps, channels):
+    # Raw BGR(A) in bottom-up rows from stdin; H.264 tuned for latency out.
+    pix_fmt = "bgra" if channels == 4 else "bgr24"
+    command = ["ffmpeg", "-loglevel", "error", "-y",
+               "-f", "rawvideo", "-pix_fmt", pix_fmt, "-s", f"{width}x{height}", "-r", f"{fps:g}", "-i", "-",
+               "-vf", "vflip", "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency",
+               "-pix_fmt", "yuv420p"]
+    if target.startswith("rtsp://"):
+        command += ["-f", "rtsp", "-rtsp_transport", "tcp"]
+    elif target.startswith(("udp://", "srt://", "tcp://")):
+        command += ["-f", "mpegts"]
+    return command + [target]
+
+
+class FFmpegEncoder:
+    """Pipes frames to an ffmpeg process; handles files and rtsp://, udp://, srt:// and tcp:// targets."""
+
+    def __init__(self, target, width, height, fps, channels):
+        if shutil.which("ffmpeg") is None:
+            raise RuntimeError("ffmpeg not found on PATH")
+        self.process = subprocess.Popen(_ffmpeg_command(target, width, height, fps, channels),
+                                        stdin=subprocess.PIPE)
+
+    def write(self, image):
+        self.process.stdin.write(memoryview(image))
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+class OpenCVEncoder:
+    """Writes a file with cv2.VideoWriter; the container and codec follow the extension."""
+
+    FOURCC = {".avi": "MJPG", ".mkv": "XVID", ".mp4": "mp4v"}
+
+    def __init__(self, target, width, height, fps, channels):
+        extension = target[target.rfind("."):].lower()
+        fourcc = cv2.VideoWriter_fourcc(*self.FOURCC.get(extension, "mp4v"))
+        self.writer = cv2.VideoWriter(target, fourcc, fps, (width, height))
+        if not self.writer.isOpened():
+            raise RuntimeError(f"could not open {target} for writing")
+        self.bgr = np.empty((height, width, 3), np.uint8) if channels == 4 else None
+        self.flipped = np.empty((height, width, 3), np.uint8)
+
+    def write(self, image):
+        if self.bgr is not None:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR, dst=self.bgr)
+        cv2.flip(image, 0, dst=self.flipped)
+        self.writer.write(self.flipped)
+
+    def close(self):
+        self.writer.release()
+
+
+def open_encoder(target, width, height, fps, channels=4, encoder="auto"):
+    if encoder == "auto":
+        encoder = "ffmpeg" if "://" in target else "opencv"
+    if encoder == "ffmpeg":
+        return FFmpegEncoder(target, width, height, fps, channels)
+    if encoder == "opencv":
+        return OpenCVEncoder(target, width, height, fps, channels)
+    raise ValueError(f"Unknown encoder: {encoder}")
+
+
+class ProgramOutput:
+    def __init__(self, base, target, fps=DEFAULT_FPS, queue_size=DEFAULT_QUEUE, encoder="auto"):
+        self.base = base
+        self.win = base.win
+        self.target = target
+        self.fps = fps
+        self.encoder_name = encoder
+        self.encoder = None
+        self.size = (self.win.getXSize(), self.win.getYSize())
+
+        # One texture being filled, one being encoded and queue_size waiting in between.
+        self.free = queue.SimpleQueue()
+        for i in range(queue_size + 2):
+            self.free.put(Texture(f"program_output_{i}"))
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.pending = None
+        self.attached = None
+        self.next_index = 0
+        self.start = None
+
+        self.captured = 0
+        self.dropped = 0
+        self.written = 0
+        self.repeated = 0
+        self.encode_ms = 0.0
+        self.error = None
+        self.closed = False
+
+        self.thread = threading.Thread(target=self._encode, daemon=True)
+        self.thread.start()
+        # Request the copy before igLoop (sort 50) renders, collect it once the frame is drawn.
+        base.taskMgr.add(self._trigger_task, "ProgramOutputTrigger", sort=49)
+        base.taskMgr.add(self._collect_task, "ProgramOutputCollect", sort=55)
+        base.finalExitCallbacks.append(self.close)
+        print(f"[Output] Recording {self.size[0]}x{self.size[1]} @ {fps:g} fps to {target}")
+
+    def _trigger_task(self, task):
+        now = time.monotonic()
+        if self.start is None:
+            self.start = now
+        index = int((now - self.start) * self.fps)
+        if index < self.next_index or self.error:
+            return task.cont
+        self.next_index = index + 1
+        try:
+            texture = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1  # the encoder still holds every texture
+            return task.cont
+        texture.clearRamImage()  # so a frame that never got drawn isn't mistaken for a copy
+        self._detach()
+        self.win.addRenderTexture(texture, GraphicsOutput.RTM_triggered_copy_ram)
+        self.attached = texture
+        self.win.triggerCopy()
+        self.pending = (index, texture)
+        return task.cont
+
+    def _detach(self):
+        # Panda3D can only clear every render texture at once, so put back any that aren't ours.
+        if self.attached is None:
+            return
+        win = self.win
+        others = [(win.getTexture(i), win.getRtmMode(i), win.getTexturePlane(i))
+                  for i in range(win.countTextures()) if win.getTexture(i) != self.attached]
+        win.clearRenderTextures()
+        for texture, mode, plane in others:
+            win.addRenderTexture(texture, mode, plane)
+        self.attached = None
+
+    def _collect_task(self, task):
+        if self.pending is None:
+            return task.cont
+        index, texture = self.pending
+        self.pending = None
+        if not texture.hasRamImage():
+            self.free.put(texture)
+            return task.cont
+        try:
+            self.frames.put_nowait((index, texture))
+            self.captured += 1
+        except queue.Full:
+            self.free.put(texture)
+            self.dropped += 1
+        return task.cont
+
+    def _encode(self):
+        width, height = self.size
+        resized = None
+        last_index = None
+        while True:
+            item = self.frames.get()
+            if item is None:
+                break
+            index, texture = item
+            start = time.monotonic()
+            try:
+                # BGRA, or BGR when the framebuffer has no alpha; rows bottom-up.
+                channels = texture.getNumComponents()
+                image = np.frombuffer(memoryview(texture.getRamImage()), np.uint8).reshape(
+                    texture.getYSize(), texture.getXSize(), channels)
+                if self.encoder is None:
+                    self.encoder = open_encoder(self.target, width, height, self.fps, channels, self.encoder_name)
+                    resized = np.empty((height, width, channels), np.uint8)
+                if image.shape != resized.shape:
+                    image = cv2.resize(image, (width, height), dst=resized)  # window was resized
+                # Hold the last frame over dropped slots so the output runs in real time.
+                repeats = 0 if last_index is None else max(0, index - last_index - 1)
+                for _ in range(repeats + 1):
+                    self.encoder.write(image)
+                self.repeated += repeats
+                self.written += repeats + 1
+                last_index = index
+            except (OSError, RuntimeError, ValueError, cv2.error) as e:
+                self.error = str(e)
+                print(f"[Output] Encoder error: {e}")
+                break
+            finally:
+                self.free.put(texture)
+            self.encode_ms += 0.1 * ((time.monotonic() - start) * 1000.0 - self.encode_ms)
+        if self.encoder:
+            try:
+                self.encoder.close()
+            except OSError as e:
+                print(f"[Output] Error closing {self.target}: {e}")
+
+    def format(self):
+        if self.error:
+            return f"output: FAILED ({self.error})"
+        return (f"output: {self.written} frames written  queue {self.frames.qsize()}  "
+                f"dropped {self.dropped}  repeated {self.repeated}  encode {self.encode_ms:.1f} ms")
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.base.taskMgr.remove("ProgramOutputTrigger")
+        self.base.taskMgr.remove("ProgramOutputCollect")
+        self._detach()
+        try:
+            self.frames.put(None, timeout=5.0)
+        except queue.Full:
+            pass
+        self.thread.join(timeout=10.0)
+        print(f"[Output] Closed {self.target}: {self.written} frames, {self.dropped} dropped, "
+              f"{self.repeated} repeated")
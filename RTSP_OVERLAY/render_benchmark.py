@@ -0,0 +1,169 @@
+import csv
+import json
+import math
+import sys
+import time
+from collections import namedtuple
+import numpy as np
+from panda3d.core import PandaSystem, PythonCallbackObject, loadPrcFileData
+from lens import ZOOM_MAX_RAW
+from tracked_views import apply_tracked_pose
+
+# Headless render benchmark: drive ViewerApp's camera from a deterministic
+# script or a recorded trace for a fixed number of frames and report frame,
+# cull and draw times plus memory as JSON, so scene and engine changes can be
+# gated on the numbers.
+#
+#   python main.py --offscreen --benchmark --frames 600 --benchmark-out bench.json
+
+BenchmarkPose = namedtuple("BenchmarkPose", "x y z pan tilt zoom focus")
+# CameraState's resting position
+DEFAULT_POSITION = (0.0, -10.0, 2.0)
+PERCENTILES = (50, 90, 95, 99)
+
+
+def configure_offscreen(width=1280, height=720, software=True):
+    # Must run before ShowBase opens its window.
+    loadPrcFileData('', 'window-type offscreen')
+    loadPrcFileData('', 'audio-library-name null')
+    loadPrcFileData('', f'win-size {width} {height}')
+    loadPrcFileData('', 'sync-video false')
+    if software:
+        # TinyPanda rasterises on the CPU, so results don't depend on a GPU or driver.
+        loadPrcFileData('', 'load-display p3tinydisplay')
+
+
+def scripted_poses(frames):
+    # One full pan sweep, two tilt oscillations and a wide → tele → wide zoom ramp.
+    for i in range(frames):
+        s = i / max(frames - 1, 1)
+        pan = 1440.0 * s - 720.0
+        tilt = 40.0 * math.sin(4 * math.pi * s)
+        zoom = int(ZOOM_MAX_RAW * (1 - abs(2 * s - 1)))
+        yield BenchmarkPose(*DEFAULT_POSITION, pan, tilt, zoom, 0)
+
+
+def read_trace(path):
+    # CSV with pan, tilt and zoom columns (x, y, z and focus optional), one row per frame.
+    with open(path, newline="") as f:
+        poses = [BenchmarkPose(
+            float(row.get("x", DEFAULT_POSITION[0])), float(row.get("y", DEFAULT_POSITION[1])),
+            float(row.get("z", DEFAULT_POSITION[2])), float(row["pan"]), float(row["tilt"]),
+            int(float(row["zoom"])), int(float(row.get("focus", 0))),
+        ) for row in csv.DictReader(f)]
+    if not poses:
+        raise ValueError(f"{path} has no poses")
+    return poses
+
+
+def trace_poses(path, frames):
+    # Loops the trace if it is shorter than frames.
+    poses = read_trace(path)
+    for i in range(frames):
+        yield poses[i % len(poses)]
+
+
+def summarize(samples_ms):
+    if not samples_ms:
+        return None
+    values = np.asarray(samples_ms)
+    summary = {"mean": float(values.mean()), "max": float(values.max())}
+    for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{p}"] = float(value)
+    return summary
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+class StageTimer:
+    """Cull and draw wall time per frame, measured around each display region's own traversal."""
+
+    def __init__(self):
+        self.cull = 0.0
+        self.draw = 0.0
+
+    def attach(self, region):
+        region.setCullCallback(PythonCallbackObject(self._cull))
+        region.setDrawCallback(PythonCallbackObject(self._draw))
+
+    def detach(self, region):
+        region.clearCullCallback()
+        region.clearDrawCallback()
+
+    def _cull(self, cbdata):
+        start = time.perf_counter()
+        cbdata.upcall()
+        self.cull += time.perf_counter() - start
+
+    def _draw(self, cbdata):
+        start = time.perf_counter()
+        cbdata.upcall()
+        self.draw += time.perf_counter() - start
+
+    def take(self):
+        cull, draw = self.cull, self.draw
+        self.cull = self.draw = 0.0
+        return cull, draw
+
+
+def run_benchmark(app, poses, warmup=30):
+    # Tracked views follow their FreeD states; in a benchmark every view follows the script instead.
+    app.taskMgr.remove("UpdateTrackedViews")
+    targets = [(view.camera, view.lens, view.lens_mapping) for view in app.tracked_views] or \
+        [(app.camera, app.camLens, app.lens_mapping)]
+
+    timer = StageTimer()
+    regions = [dr for dr in app.win.getActiveDisplayRegions() if not dr.getCamera().isEmpty()]
+    for region in regions:
+        timer.attach(region)
+
+    frame_ms, cull_ms, draw_ms = [], [], []
+    rss_start = peak_rss_mb()
+    for i, pose in enumerate(poses):
+        for camera, lens, mapping in targets:
+            apply_tracked_pose(camera, lens, pose.x, pose.y, pose.z, pose.pan, pose.tilt, pose.zoom,
+                               mapping, pose.focus)
+        start = time.perf_counter()
+        app.taskMgr.step()
+        elapsed = time.perf_counter() - start
+        cull, draw = timer.take()
+        if i >= warmup:
+            frame_ms.append(elapsed * 1000)
+            cull_ms.append(cull * 1000)
+            draw_ms.append(draw * 1000)
+
+    for region in regions:
+        timer.detach(region)
+
+    frame = summarize(frame_ms)
+    return {
+        "scene": app.scenes.active,
+        "frames": len(frame_ms),
+        "warmup": warmup,
+        "views": len(targets),
+        "window": [app.win.getXSize(), app.win.getYSize()],
+        "pipe": app.pipe.getInterfaceName(),
+        "panda3d": PandaSystem.getVersionString(),
+        "fps_mean": 1000.0 / frame["mean"] if frame else None,
+        "frame_ms": frame,
+        "cull_ms": summarize(cull_ms),
+        "draw_ms": summarize(draw_ms),
+        "memory": {"peak_rss_mb_start": rss_start, "peak_rss_mb": peak_rss_mb()},
+    }
+
+
+def write_report(report, path=None):
+    text = json.dumps(report, indent=2)
+    if path:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
@@ -1,29 +1,138 @@
 import cv2
+import os
 import threading
 import time
+from collections import namedtuple
+
+# One decoded video frame. `image` is a read-only view into the stream's buffer
+# pool, so handing it out costs nothing; `seq` increases by one per published
+# frame and `t` is the time.monotonic() it was captured. `pts` is the stream
+# timestamp in ms (None if the backend doesn't report one), `age` the
+# estimated time in ms the frame sat in network/decoder buffers before we got
+# it, and `scale` the factor from camera pixels to image pixels.
+VideoFrame = namedtuple("VideoFrame", "seq t image pts age scale", defaults=(None, 0.0, 1.0))
+
+# FFmpeg demuxer options that stop it from buffering ahead of live.
+LOW_LATENCY_OPTIONS = "fflags;nobuffer|flags;low_delay|max_delay;0|reorder_queue_size;0"
+
 
 class RTSPStream:
-    def __init__(self, url, reconnect_delay=5):
+    """Background RTSP reader that always hands out the newest frame.
+
+    With max_drain, frames that queued up while the reader was busy with
+    the previous one are grabbed without being retrieved (no colour
+    conversion or copy) and only the newest is retrieved, so the stream
+    never falls behind live. decode_scale < 1 shrinks frames at
+    retrieve time; OpenCV can't ask FFmpeg's H.264 decoder for a smaller
+    picture, so use the camera's substream when it offers a lower resolution.
+    """
+
+    def __init__(self, url, reconnect_delay=5, pool_size=3, low_latency=True, transport=None,
+                 max_drain=8, decode_scale=1.0):
         self.url = url
         self.cap = None
         self.frame = None
-        self.lock = threading.Lock()
+        self.seq = 0
+        self.pool_size = pool_size
+        self.pool = [None] * pool_size
         self.running = True
         self.reconnect_delay = reconnect_delay
+        self.low_latency = low_latency
+        self.transport = transport
+        self.max_drain = max_drain
+        self.decode_scale = decode_scale
+        self.full_frame = None
+
+        self.frames = 0
+        self.skipped = 0
+        self.fps = 0.0
+        self.capture_age_ms = 0.0
+        self.retrieve_ms = 0.0
+        self._lag_baseline = None
+        self._frame_interval = 1 / 30.0
+        self._grab_threshold = 0.016
+        self._last_grab = None
 
         self.thread = threading.Thread(target=self._reader, daemon=True)
         self.thread.start()
 
     def _connect(self):
         print(f"[RTSP] Connecting to {self.url}...")
-        cap = cv2.VideoCapture(self.url)
+        options = []
+        if self.transport:
+            options.append(f"rtsp_transport;{self.transport}")
+        if self.low_latency:
+            options.append(LOW_LATENCY_OPTIONS)
+        # The FFmpeg backend only reads its options from the environment, at open time.
+        if options and "OPENCV_FFMPEG_CAPTURE_OPTIONS" not in os.environ:
+            os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = "|".join(options)
+            cap = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG)
+            del os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"]
+        else:
+            cap = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG)
         if not cap.isOpened():
             print(f"[RTSP] Failed to connect to {self.url}")
             return None
+        if self.low_latency:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        # A queued frame grabs in well under half a frame interval; a live one waits for the network.
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        fps = fps if 5 <= fps <= 120 else 30.0
+        self._frame_interval = 1.0 / fps
+        self._grab_threshold = 0.5 / fps
+        self._last_grab = None
+        self._lag_baseline = None
         print(f"[RTSP] Connected.")
         return cap
 
+    def _grab_latest(self):
+        # Returns the number of queued frames skipped, or None if the stream failed.
+        # Frames can only have queued up while we were away retrieving and publishing.
+        start = time.monotonic()
+        away = start - self._last_grab if self._last_grab is not None else 0.0
+        backlog = min(self.max_drain, int(away / self._frame_interval))
+        skipped = 0
+        while True:
+            if not self.cap.grab():
+                return None
+            now = time.monotonic()
+            # A grab that had to wait is live; one more grab would block until the next frame.
+            if skipped >= backlog or now - start > self._grab_threshold:
+                break
+            start = now
+            skipped += 1
+        self._last_grab = now
+        return skipped
+
+    def _retrieve(self, slot):
+        if self.decode_scale == 1.0:
+            ret, image = self.cap.retrieve(self.pool[slot])
+            return image if ret else None
+        ret, self.full_frame = self.cap.retrieve(self.full_frame)
+        if not ret:
+            return None
+        h, w = self.full_frame.shape[:2]
+        size = (max(1, int(w * self.decode_scale)), max(1, int(h * self.decode_scale)))
+        target = self.pool[slot]
+        if target is None or target.shape[1::-1] != size:
+            target = None
+        return cv2.resize(self.full_frame, size, dst=target, interpolation=cv2.INTER_AREA)
+
+    def _measure(self, captured):
+        # Stream time vs. our clock: the smallest gap seen is the live baseline, anything above is queueing.
+        pts = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        if not pts or pts < 0:
+            return None, 0.0
+        lag = captured - pts / 1000.0
+        if self._lag_baseline is None or lag < self._lag_baseline:
+            self._lag_baseline = lag
+        age = (lag - self._lag_baseline) * 1000.0
+        self.capture_age_ms += 0.1 * (age - self.capture_age_ms)
+        return pts, age
+
     def _reader(self):
+        last = None
         while self.running:
             if self.cap is None or not self.cap.isOpened():
                 self.cap = self._connect()
@@ -31,20 +140,52 @@ class RTSPStream:
                     time.sleep(self.reconnect_delay)
                     continue
 
-            ret, frame = self.cap.read()
-            if not ret:
+            skipped = self._grab_latest()
+            if skipped is None:
                 print("[RTSP] Frame grab failed. Reconnecting...")
                 self.cap.release()
                 self.cap = None
                 time.sleep(self.reconnect_delay)
                 continue
+            captured = time.monotonic()
+
+            # Decode straight into the pool slot after the one readers were last given.
+            slot = (self.seq + 1) % self.pool_size
+            image = self._retrieve(slot)
+            if image is None:
+                continue
+            self.retrieve_ms = (time.monotonic() - captured) * 1000.0
+            pts, age = self._measure(captured)
 
-            with self.lock:
-                self.frame = frame
+            # OpenCV allocates a new array on the first frame or a resolution change; keep it for reuse.
+            self.pool[slot] = image
+            view = image.view()
+            view.flags.writeable = False
+            # A single reference assignment publishes seq, time and pixels together.
+            self.frame = VideoFrame(self.seq + 1, captured, view, pts, age, self.decode_scale)
+            self.seq += 1
+
+            self.frames += 1
+            self.skipped += skipped
+            if last is not None:
+                self.fps += 0.1 * (1.0 / max(captured - last, 1e-6) - self.fps)
+            last = captured
+
+    def latest(self):
+        return self.frame
+
+    def is_current(self, frame):
+        # The reader reuses pool slots, so a frame stays intact only while fewer than pool_size - 1 newer ones exist.
+        return self.seq - frame.seq < self.pool_size - 1
 
     def get_frame(self):
-        with self.lock:
-            return self.frame.copy() if self.frame is not None else None
+        # A private copy, safe to keep or modify; use latest() for the zero-copy view.
+        frame = self.frame
+        return frame.image.copy() if frame is not None else None
+
+    def format(self):
+        return (f"video: {self.fps:.1f} fps  queued {self.capture_age_ms:.0f} ms  "
+                f"retrieve {self.retrieve_ms:.1f} ms  skipped {self.skipped}/{self.frames + self.skipped}")
 
     def stop(self):
         print("[RTSP] Stopping stream...")
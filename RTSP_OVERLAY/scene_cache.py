@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import re
+import time
+from panda3d.core import Filename, PandaSystem
+from scene_optimize import optimize_scene
+
+CACHE_DIR = "cache"
+INDEX_NAME = "index.json"
+# Bump when the conversion itself changes so old BAMs are rebuilt.
+PIPELINE_VERSION = 3
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SceneCache:
+    """Optimized, flattened .bam copies of scene sources, keyed by content hash and Panda3D version.
+
+    The index remembers each source's size/mtime → hash so unchanged files are
+    not re-hashed on every launch.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, INDEX_NAME)
+        self.index = {}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path) as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError):
+                self.index = {}
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def source_hash(self, path):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        entry = self.index.get(key)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return entry["hash"]
+        digest = file_digest(path)
+        self.index[key] = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": digest}
+        self._save_index()
+        return digest
+
+    def _source_prefix(self, path):
+        # Stem plus a hash of the source's location, so same-named scenes in different folders never collide.
+        stem = os.path.splitext(os.path.basename(path))[0]
+        location = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:8]
+        return f"{stem}-{location}"
+
+    def cache_path(self, path):
+        key = hashlib.sha256(
+            f"{self.source_hash(path)}|{PandaSystem.getVersionString()}|{PIPELINE_VERSION}".encode()
+        ).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{self._source_prefix(path)}-{key}.bam")
+
+    def convert(self, loader, path, out_path):
+        model = loader.loadModel(Filename.fromOsSpecific(os.path.abspath(path)), noCache=True)
+        optimize_scene(model)
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        tmp_path = out_path + ".tmp"
+        if not model.writeBamFile(Filename.fromOsSpecific(tmp_path)):
+            raise IOError(f"Failed to write {out_path}")
+        os.replace(tmp_path, out_path)
+        return model
+
+    def load(self, loader, path):
+        start = time.perf_counter()
+        if path.lower().endswith(".bam"):
+            model = loader.loadModel(Filename.fromOsSpecific(os.path.abspath(path)))
+            print(f"[SceneCache] Loaded {path} in {time.perf_counter() - start:.2f}s")
+            return model
+
+        cached = self.cache_path(path)
+        if os.path.exists(cached):
+            model = loader.loadModel(Filename.fromOsSpecific(os.path.abspath(cached)), noCache=True)
+            print(f"[SceneCache] Warm load {path} from {cached} in {time.perf_counter() - start:.2f}s")
+            return model
+
+        model = self.convert(loader, path, cached)
+        self.prune(path, keep=cached)
+        print(f"[SceneCache] Cold load {path} in {time.perf_counter() - start:.2f}s (cached as {cached})")
+        return model
+
+    def prune(self, path, keep):
+        # Drop stale conversions of the same source so the cache doesn't grow on every edit.
+        # Names without a location hash predate it and are never read any more.
+        stem = os.path.splitext(os.path.basename(path))[0]
+        location = self._source_prefix(path)[len(stem) + 1:]
+        pattern = re.compile(re.escape(stem) + rf"-(?:{location}-)?[0-9a-f]{{16}}\.bam")
+        for name in os.listdir(self.cache_dir):
+            full = os.path.join(self.cache_dir, name)
+            if pattern.fullmatch(name) and full != keep:
+                os.remove(full)
+
+
+def load_scene_model(loader, path, cache_dir=CACHE_DIR):
+    return SceneCache(cache_dir).load(loader, path)
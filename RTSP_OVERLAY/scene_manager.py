@@ -1,40 +1,54 @@
-import cv2
-import numpy as np
-import os
-import requests
-import threading
 import time
-from panda3d.core import Filename, AmbientLight, DirectionalLight, LVector3, Vec3, loadPrcFileData, Loader, Texture, CardMaker, TransparencyAttrib
+from panda3d.core import AmbientLight, DirectionalLight, LVector3, loadPrcFileData
 from direct.showbase.ShowBase import ShowBase
 from direct.task import Task
 from direct.gui.DirectGui import DirectEntry, DirectButton, OnscreenText
-from camera_state import shared_camera
-from freed_listener import start_freed_listener
+from bbox_poller import BBoxPoller
+from camera_state import idle_pose, shared_camera
+from freed_listener import start_freed_listener, load_freed_config
+from latency_stats import LatencyMonitor
+from tracked_views import apply_tracked_pose, build_tracked_views
+from lens import load_lens_registry
+from overlay_compositor import TalentCompositor
+from overlay_config import load_overlay_config
+from program_output import ProgramOutput
+from scene_registry import SceneRegistry
+import pose_filter
 from rtsp_stream import RTSPStream
-from shared_state import shared_state
+from video_sync import VideoSync
 
 loadPrcFileData('', 'window-title FreeD Virtual Viewer')
 loadPrcFileData('', 'win-size 1280 720')
 
 class ViewerApp(ShowBase):
-    def __init__(self):
+    # offline=True builds only the scene, camera and lens for rendering poses headless:
+    # no preloading, file watching or program output.
+    def __init__(self, multiview=False, record=None, offline=False):
         super().__init__()
 
         self.connected = False
         self.rtsp_stream = None
-        self.bbox_api = None
-        self.texture = Texture()
+        self.bbox_poller = None
+        self.overlay_config = load_overlay_config()
+        self.compositor = None
+        self.overlay_seq = None
+        self.overlay_frame = None
+        self.video_sync = VideoSync(shared_camera, **self.overlay_config["sync"])
         self.last_bbox = None
 
-        # Load scene
-        model_path = next((os.path.join("scenes", f) for f in os.listdir("scenes")
-                          if os.path.splitext(f)[1].lower() in [".obj", ".bam", ".glb"]), None)
-        if not model_path:
+        # Lens profiles load once; the single-camera view follows the primary camera's lens
+        self.lenses = load_lens_registry()
+        self.lens_mapping = self.lenses.for_camera(load_freed_config()["primary_camera_id"])
+
+        # Load scene; "n" switches to the next scene in config/scenes.json
+        self.scenes = SceneRegistry(self, on_swap=self.on_scene_swap, watch_interval=None if offline else 1.0,
+                                    preload=not offline)
+        scene_name = self.scenes.initial_scene()
+        if not scene_name:
             raise FileNotFoundError("No scene file found.")
-        self.scene = self.loader.loadModel(Filename.fromOsSpecific(model_path))
-        self.scene.reparentTo(self.render)
-        self.scene.setScale(1, 1, 1)
-        self.scene.setPos(0, 0, 0)
+        self.scenes.load_now(scene_name)
+        self.scenes.activate(scene_name)
+        self.accept("n", self.scenes.activate_next)
 
         # Lighting
         ambient = AmbientLight("ambient")
@@ -57,7 +71,33 @@ class ViewerApp(ShowBase):
 
         self.status_text = OnscreenText(text="Disconnected", pos=(0.0, 0.8), scale=0.05)
 
-        self.card = None
+        # Motion-to-photon instrumentation; "l" toggles the HUD
+        freed_config = load_freed_config()
+        self.latency = LatencyMonitor(dump_interval=freed_config["latency_dump_interval_s"])
+        self.latency_text = OnscreenText(text="", pos=(0.0, 0.72), scale=0.035, mayChange=True)
+        if not freed_config["latency_hud"]:
+            self.latency_text.hide()
+        self.accept("l", self.toggle_latency_hud)
+        self.accept("t", shared_camera.reset_tilt_calibration)
+        self.accept("k", self.recalibrate_key)
+        self.frame_arrival = None
+        self.applied_seq = None
+        self.latency_hud_updated = 0.0
+        # igLoop renders and flips at sort 50, so this runs once the frame is presented
+        self.taskMgr.add(self.frame_presented_task, "FramePresented", sort=60)
+
+        self.tracked_views = []
+        if multiview:
+            self.setup_multiview()
+
+        # Program output (scene plus talent, as shown in the window) to a file or stream
+        output = dict(self.overlay_config["output"])
+        if record:
+            output["target"] = record
+        self.program_output = ProgramOutput(self, **output) if output.get("target") and not offline else None
+
+    def on_scene_swap(self, name, scene):
+        self.scene = scene
 
     def connect(self):
         ip = self.ip_entry.get().strip()
@@ -65,18 +105,19 @@ class ViewerApp(ShowBase):
             return
         self.status_text.setText(f"Connecting to {ip}...")
 
-        self.rtsp_stream = RTSPStream(f"rtsp://{ip}:554/2")
-        self.bbox_api = f"http://{ip}/cgi-bin/param.cgi?get_tally_status"
-        start_freed_listener(port=19148)
+        self.rtsp_stream = RTSPStream(f"rtsp://{ip}:554/2", **self.overlay_config["video"])
+        # Polled on its own thread; the overlay task only ever reads the cached result.
+        self.bbox_poller = BBoxPoller(f"http://{ip}/cgi-bin/param.cgi?get_tally_status",
+                                      **self.overlay_config["bbox"])
+        start_freed_listener()
 
-        cm = CardMaker("video_card")
-        cm.setFrameFullscreenQuad()
-        self.card = self.render2d.attachNewNode(cm.generate())
-        self.card.setTransparency(TransparencyAttrib.MAlpha)
-        self.card.setTexture(self.texture)
+        self.compositor = TalentCompositor(self.render2d)
+        self.overlay_seq = None
+        self.overlay_frame = None
 
         self.taskMgr.add(self.update_overlay_task, "UpdateOverlay")
-        self.taskMgr.add(self.update_camera_task, "UpdateCamera")
+        # After the overlay, so the camera matches the frame composited this render frame.
+        self.taskMgr.add(self.update_camera_task, "UpdateCamera", sort=1)
         self.connected = True
         self.status_text.setText(f"Connected to {ip}")
 
@@ -84,23 +125,18 @@ class ViewerApp(ShowBase):
         self.connected = False
         self.status_text.setText("Disconnected")
         self.rtsp_stream = None
-        self.bbox_api = None
+        if self.bbox_poller:
+            self.bbox_poller.stop()
+            self.bbox_poller = None
         self.last_bbox = None
-        if self.card:
-            self.card.removeNode()
-            self.card = None
-
-    def fetch_bbox(self):
-        try:
-            response = requests.get(self.bbox_api, timeout=0.3)
-            if response.ok:
-                data = response.json()
-                if data["data"]["objs"]:
-                    obj = data["data"]["objs"][0]
-                    return obj["X"], obj["Y"], obj["X"] + obj["Width"], obj["Y"] + obj["Height"]
-        except Exception as e:
-            print("[BBOX] Error:", e)
-        return None
+        self.overlay_frame = None
+        if self.compositor:
+            self.compositor.destroy()
+            self.compositor = None
+
+    def recalibrate_key(self):
+        if self.compositor:
+            self.compositor.recalibrate()
 
     def smooth_bbox(self, new_bbox, alpha=0.2):
         if self.last_bbox is None:
@@ -116,48 +152,23 @@ class ViewerApp(ShowBase):
         if not self.connected or not self.rtsp_stream:
             return Task.cont
 
-        frame = self.rtsp_stream.get_frame()
-        if frame is None:
+        # Video runs slower than the render loop; a frame that's already composited needs no work.
+        frame = self.rtsp_stream.latest()
+        if frame is None or frame.seq == self.overlay_seq:
             return Task.cont
-
-        bbox = self.fetch_bbox()
-        if bbox:
-            x1, y1, x2, y2 = self.smooth_bbox(bbox)
-            x1, y1 = max(0, x1), max(0, y1)
-            x2, y2 = min(frame.shape[1], x2), min(frame.shape[0], y2)
-            if x2 > x1 and y2 > y1:
-                cropped = frame[y1:y2, x1:x2]
-
-                hsv = cv2.cvtColor(cropped, cv2.COLOR_BGR2HSV)
-                lower_green = np.array([35, 40, 40])
-                upper_green = np.array([85, 255, 255])
-                mask = cv2.inRange(hsv, lower_green, upper_green)
-
-                if np.mean(mask) < 5:
-                    gray = cv2.cvtColor(cropped, cv2.COLOR_BGR2GRAY)
-                    _, alpha = cv2.threshold(gray, 50, 255, cv2.THRESH_BINARY)
-                else:
-                    alpha = cv2.bitwise_not(mask)
-
-                rgb = cv2.cvtColor(cropped, cv2.COLOR_BGR2RGB)
-                bgra = cv2.merge((rgb[:, :, 0], rgb[:, :, 1], rgb[:, :, 2], alpha))
-
-                win_w, win_h = self.win.getXSize(), self.win.getYSize()
-                target_h = win_h // 2
-                scale = target_h / bgra.shape[0]
-                new_w = int(bgra.shape[1] * scale)
-                resized = cv2.resize(bgra, (new_w, target_h))
-
-                padded = np.zeros((win_h, win_w, 4), dtype=np.uint8)
-                offset_x = (win_w - new_w) // 2
-                offset_y = (win_h - target_h) // 2
-                padded[offset_y:offset_y + target_h, offset_x:offset_x + new_w] = resized
-
-                flipped = cv2.flip(padded, 0)
-
-                if not self.texture.getXSize():
-                    self.texture.setup2dTexture(win_w, win_h, Texture.T_unsigned_byte, Texture.F_rgba)
-                self.texture.setRamImageAs(flipped.flatten(), "RGBA")
+        self.overlay_seq = frame.seq
+        self.overlay_frame = frame
+        self.video_sync.observe(frame)
+
+        bbox = self.bbox_poller.latest()
+        # The reader reuses its pool slots; if the work above ran long, this frame's pixels may be overwritten.
+        if bbox and self.rtsp_stream.is_current(frame):
+            # The camera reports the bbox in full-resolution pixels.
+            bbox = self.smooth_bbox(bbox)
+            if frame.scale != 1.0:
+                bbox = tuple(int(v * frame.scale) for v in bbox)
+            self.compositor.composite(frame.image, bbox,
+                                      self.win.getXSize(), self.win.getYSize())
 
         return Task.cont
 
@@ -165,28 +176,77 @@ class ViewerApp(ShowBase):
         if not self.connected:
             return Task.cont
 
+        # Under live video, render the pose from when the composited frame was shot; otherwise predict ahead.
+        latest = shared_camera.snapshot()
+        pose = self.video_sync.pose_for(self.overlay_frame)
+        if pose is not None:
+            pan, tilt, zoom = pose.pan, pose.tilt, pose.zoom
+        else:
+            pose = latest
+            pan, tilt, zoom = shared_camera.predict(pose=pose)
+
         # Handle idle animation
         if shared_camera.should_idle():
-            elapsed = time.time() - shared_camera.last_idle_start
-            shared_camera.pan = 20 * np.sin(elapsed * 0.5)
-            shared_camera.tilt = 5 * np.cos(elapsed * 0.3)
-
-        self.camera.setPos(shared_camera.x, shared_camera.y, shared_camera.z)
-        current_hpr = self.camera.getHpr()
-        target_hpr = Vec3(shared_camera.pan * 0.25, shared_camera.tilt * 0.25, 0)
-        new_hpr = current_hpr + (target_hpr - current_hpr) * 0.1
-        self.camera.setHpr(new_hpr)
-
-        zoom_min_raw = 0x000000
-        zoom_max_raw = 0x400000
-        clamped_zoom = max(min(shared_camera.zoom, zoom_max_raw), zoom_min_raw)
-
-        min_fov = 3.5
-        max_fov = 60.7
-        zoom_ratio = (clamped_zoom - zoom_min_raw) / (zoom_max_raw - zoom_min_raw)
-        fov = max_fov - zoom_ratio * (max_fov - min_fov)
-        self.camLens.setFov(fov)
+            pan, tilt = idle_pose(shared_camera.clock() - shared_camera.last_idle_start)
+            self.frame_arrival = None
+        elif latest.seq != self.applied_seq:
+            # Each packet is timed once, on the first frame that applies it; later frames only re-render it.
+            self.applied_seq = latest.seq
+            self.frame_arrival = latest.t
+            self.latency.record_apply(latest.t)
+        else:
+            self.frame_arrival = None
+
+        apply_tracked_pose(self.camera, self.camLens, pose.x, pose.y, pose.z, pan, tilt, zoom,
+                           self.lens_mapping, pose.focus)
+
+        return Task.cont
+
+    def setup_multiview(self):
+        # One scene, one tracked camera per configured FreeD ID; the default camera is parked.
+        # The listener starts first so a configured primary camera shares shared_camera's state.
+        start_freed_listener()
+        self.tracked_views = build_tracked_views(self, lenses=self.lenses)
+        if not self.tracked_views:
+            print("[Multiview] No views configured in config/cameras.json")
+            return
+        self.camNode.setActive(False)
+        self.taskMgr.add(self.update_tracked_views_task, "UpdateTrackedViews")
+        print(f"[Multiview] Rendering cameras {[v.camera_id for v in self.tracked_views]}")
+
+    def update_tracked_views_task(self, task):
+        # Every view extrapolates to the same display time so the regions stay in step.
+        at = time.monotonic() + pose_filter.settings["latency_ms"] / 1000.0
+        for view in self.tracked_views:
+            view.update(at)
+        return Task.cont
 
+    def toggle_latency_hud(self):
+        if self.latency_text.isHidden():
+            self.latency_text.show()
+        else:
+            self.latency_text.hide()
+
+    def frame_presented_task(self, task):
+        now = time.monotonic()
+        if self.frame_arrival is not None:
+            self.latency.record_present(self.frame_arrival, now)
+
+        if not self.latency_text.isHidden() and now - self.latency_hud_updated > 0.25:
+            self.latency_hud_updated = now
+            text = (self.latency.format() +
+                    f"\ntilt offset {shared_camera.tilt_offset:.2f}°"
+                    f"  confidence {shared_camera.tilt_confidence:.0%}  (t: reset)")
+            if self.rtsp_stream:
+                text += "\n" + self.rtsp_stream.format() + "\n" + self.video_sync.format()
+            if self.compositor:
+                text += "\n" + self.compositor.format()
+            if self.bbox_poller:
+                text += "\n" + self.bbox_poller.format()
+            if self.program_output:
+                text += "\n" + self.program_output.format()
+            self.latency_text.setText(text)
+        self.latency.maybe_dump(now)
         return Task.cont
 
 def load_scene():
@@ -0,0 +1,220 @@
+from panda3d.core import (GeomVertexReader, GeomVertexRewriter, InternalName, MaterialAttrib, NodePath,
+                          PNMImage, SamplerState, Texture, TextureAttrib, TextureStage)
+from spatial_index import build_spatial_index
+
+# Scene-conversion pass: canonicalise identical materials, pack small clamped
+# textures into atlases with remapped UVs, then flatten across the now-equal
+# RenderStates so they can share Geoms. With spatial=True the final flatten
+# happens per cell of a bounding volume hierarchy (see spatial_index.py) rather
+# than across the whole scene, so zoomed-in views can cull most of it.
+
+
+def _material_key(material):
+    def value(has, get):
+        return tuple(get()) if has() else None
+    return (
+        value(material.hasAmbient, material.getAmbient),
+        value(material.hasDiffuse, material.getDiffuse),
+        value(material.hasSpecular, material.getSpecular),
+        value(material.hasEmission, material.getEmission),
+        value(material.hasBaseColor, material.getBaseColor),
+        material.getShininess() if not material.hasRoughness() else None,
+        material.getRoughness() if material.hasRoughness() else None,
+        material.getMetallic() if material.hasMetallic() else None,
+        material.getRefractiveIndex(),
+        material.getLocal(),
+        material.getTwoside(),
+    )
+
+
+def _texture_key(texture):
+    if texture.hasFullpath():
+        return ("file", texture.getFullpath().getFullpath(), texture.getFormat())
+    if texture.hasRamImage():
+        return ("ram", texture.getXSize(), texture.getYSize(), texture.getFormat(), bytes(texture.getRamImage()))
+    return ("object", id(texture))
+
+
+def _geom_slots(root):
+    for path in root.findAllMatches("**/+GeomNode"):
+        node = path.node()
+        for i in range(node.getNumGeoms()):
+            yield node, i
+
+
+def count_states(root):
+    states, geoms = set(), 0
+    for node, i in _geom_slots(root):
+        geoms += 1
+        states.add(node.getGeomState(i).compose(NodePath(node).getNetState()))
+    return len(states), geoms
+
+
+def dedupe_materials_and_textures(root):
+    materials, textures = {}, {}
+    merged_materials = merged_textures = 0
+
+    def canonical_state(state):
+        nonlocal merged_materials, merged_textures
+        attrib = state.getAttrib(MaterialAttrib)
+        if attrib is not None and attrib.getMaterial() is not None:
+            material = attrib.getMaterial()
+            canon = materials.setdefault(_material_key(material), material)
+            if canon is not material:
+                merged_materials += 1
+                state = state.setAttrib(MaterialAttrib.make(canon))
+
+        attrib = state.getAttrib(TextureAttrib)
+        if attrib is not None:
+            for n in range(attrib.getNumOnStages()):
+                stage = attrib.getOnStage(n)
+                texture = attrib.getOnTexture(stage)
+                canon = textures.setdefault(_texture_key(texture), texture)
+                if canon is not texture:
+                    merged_textures += 1
+                    attrib = attrib.addOnStage(stage, canon)
+            state = state.setAttrib(attrib)
+        return state
+
+    for path in [root] + list(root.findAllMatches("**")):
+        path.setState(canonical_state(path.getState()))
+    for node, i in _geom_slots(root):
+        node.setGeomState(i, canonical_state(node.getGeomState(i)))
+    return merged_materials, merged_textures
+
+
+def _uvs_in_unit_square(vdata, column):
+    reader = GeomVertexReader(vdata, column)
+    while not reader.isAtEnd():
+        u, v = reader.getData2()
+        if u < -1e-4 or u > 1.0001 or v < -1e-4 or v > 1.0001:
+            return False
+    return True
+
+
+def _shelf_pack(sizes, atlas_size, padding):
+    # Tallest-first shelf packing; returns {index: (x, y)} in image coordinates or None if it doesn't fit.
+    placements, x, y, shelf_h = {}, padding, padding, 0
+    for index in sorted(range(len(sizes)), key=lambda k: -sizes[k][1]):
+        w, h = sizes[index]
+        if x + w + padding > atlas_size:
+            x, y, shelf_h = padding, y + shelf_h + padding, 0
+        if y + h + padding > atlas_size:
+            return None
+        placements[index] = (x, y)
+        x += w + padding
+        shelf_h = max(shelf_h, h)
+    return placements
+
+
+def atlas_textures(root, max_tile=256, atlas_size=2048, padding=2):
+    # Candidates: single-stage geoms whose texture is small, readable and never tiled.
+    # An instanced GeomNode is found once per path but its UVs must only be remapped once.
+    users = {}
+    seen = set()
+    for node, i in _geom_slots(root):
+        if (node, i) in seen:
+            continue
+        seen.add((node, i))
+        state = node.getGeomState(i)
+        attrib = state.getAttrib(TextureAttrib)
+        if attrib is None or attrib.getNumOnStages() != 1:
+            continue
+        stage = attrib.getOnStage(0)
+        texture = attrib.getOnTexture(stage)
+        if texture.getXSize() > max_tile or texture.getYSize() > max_tile or not texture.mightHaveRamImage():
+            continue
+        column = stage.getTexcoordName() or InternalName.getTexcoord()
+        if not node.getGeom(i).getVertexData().hasColumn(column):
+            continue
+        users.setdefault(texture, []).append((node, i, stage, column))
+
+    usable = []
+    for texture, slots in users.items():
+        if all(_uvs_in_unit_square(node.getGeom(i).getVertexData(), column) for node, i, _, column in slots):
+            usable.append(texture)
+    if len(usable) < 2:
+        return 0
+
+    sizes = [(t.getXSize(), t.getYSize()) for t in usable]
+    placements = _shelf_pack(sizes, atlas_size, padding)
+    if placements is None:
+        print(f"[Optimize] {len(usable)} textures don't fit a {atlas_size}px atlas; skipping atlasing")
+        return 0
+
+    atlas_image = PNMImage(atlas_size, atlas_size, 4)
+    for index, texture in enumerate(usable):
+        tile = PNMImage()
+        texture.store(tile)
+        tile.addAlpha()
+        x, y = placements[index]
+        w, h = sizes[index]
+        atlas_image.copySubImage(tile, x, y)
+        # Extend the tile's edges into its padding so filtering doesn't bleed neighbours in.
+        for dx in range(-padding, w + padding):
+            for dy in range(-padding, h + padding):
+                if 0 <= dx < w and 0 <= dy < h:
+                    continue
+                sx, sy = min(max(dx, 0), w - 1), min(max(dy, 0), h - 1)
+                atlas_image.setXelA(x + dx, y + dy, tile.getXelA(sx, sy))
+
+    atlas = Texture("atlas")
+    atlas.load(atlas_image)
+    atlas.setWrapU(SamplerState.WM_clamp)
+    atlas.setWrapV(SamplerState.WM_clamp)
+    atlas.setMinfilter(SamplerState.FT_linear_mipmap_linear)
+
+    for index, texture in enumerate(usable):
+        x, y = placements[index]
+        w, h = sizes[index]
+        # PNMImage rows run top-down, texture V runs bottom-up.
+        u0, v0 = x / atlas_size, 1.0 - (y + h) / atlas_size
+        su, sv = w / atlas_size, h / atlas_size
+        for node, i, stage, column in users[texture]:
+            geom = node.modifyGeom(i)
+            writer = GeomVertexRewriter(geom.modifyVertexData(), column)
+            while not writer.isAtEnd():
+                u, v = writer.getData2()
+                writer.setData2(u0 + u * su, v0 + v * sv)
+            # Share one stage where possible so the atlased Geoms end up with identical states.
+            if stage.getTexcoordName() == InternalName.getTexcoord():
+                stage = TextureStage.getDefault()
+            state = node.getGeomState(i)
+            node.setGeomState(i, state.setAttrib(TextureAttrib.make().addOnStage(stage, atlas)))
+    return len(usable)
+
+
+def optimize_scene(root, atlas=True, clear_model_nodes=True, spatial=True, verbose=True):
+    states_before, geoms_before = count_states(root)
+    # Bake transforms into vertices and compose parent states into Geom states where Panda3D can.
+    # Nodes that must keep their own state stop it, so node-level states can remain and the
+    # passes below look at both.
+    root.flattenLight()
+    merged_materials, merged_textures = dedupe_materials_and_textures(root)
+    atlased = atlas_textures(root) if atlas else 0
+    if clear_model_nodes:
+        root.clearModelNodes()
+    index = build_spatial_index(root) if spatial else None
+    if index is None:
+        root.flattenStrong()
+    states_after, geoms_after = count_states(root)
+
+    if verbose:
+        print(f"[Optimize] materials merged: {merged_materials}, textures merged: {merged_textures}, "
+              f"textures atlased: {atlased}")
+        print(f"[Optimize] render states {states_before} → {states_after} "
+              f"(-{states_before - states_after}), geoms {geoms_before} → {geoms_after} "
+              f"(-{geoms_before - geoms_after})")
+        if index is not None:
+            print(f"[Optimize] spatial index: {index.cells} cells, {index.lod_nodes} detail LODs")
+    return {
+        "materials_merged": merged_materials,
+        "textures_merged": merged_textures,
+        "textures_atlased": atlased,
+        "states_before": states_before,
+        "states_after": states_after,
+        "geoms_before": geoms_before,
+        "geoms_after": geoms_after,
+        "cells": index.cells if index is not None else 0,
+        "lod_nodes": index.lod_nodes if index is not None else 0,
+    }
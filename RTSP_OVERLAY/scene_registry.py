@@ -0,0 +1,216 @@
+import json
+import os
+import queue
+import threading
+from panda3d.core import Filename
+from scene_cache import SceneCache
+
+CONFIG_PATH = os.path.join("config", "scenes.json")
+SCENE_DIR = "scenes"
+SCENE_EXTENSIONS = (".obj", ".bam", ".glb")
+
+
+class SceneEntry:
+    def __init__(self, name, path, description="", preload=False):
+        self.name = name
+        self.path = path
+        self.description = description
+        self.preload = preload
+        self.node = None
+        self.mtime = None
+        self.loading = False
+
+
+class SceneRegistry:
+    """Scenes listed in config/scenes.json, loaded off the render thread and swapped in between frames.
+
+    Hashing and any GLB→BAM conversion run on one worker thread, the BAM itself
+    is read by Panda3D's asynchronous loader, and textures/geometry are
+    prepared on the GSG before a scene is made visible, so activating a scene
+    never stalls the camera task. Source files are polled for changes and only
+    the scenes whose files changed are reloaded.
+    """
+
+    def __init__(self, app, parent=None, config_path=CONFIG_PATH, scene_dir=SCENE_DIR,
+                 cache=None, on_swap=None, watch_interval=1.0, preload=True):
+        self.app = app
+        self.parent = parent if parent is not None else app.render
+        self.config_path = config_path
+        self.scene_dir = scene_dir
+        self.cache = cache or SceneCache()
+        self.on_swap = on_swap
+        self.preload = preload
+        self.entries = {}
+        self.order = []
+        self.default = None
+        self.active = None
+        self._pending_activate = None
+        self._converted = queue.Queue()
+        self._requests = queue.Queue()
+        self._worker = None
+        # The cache's index and the loader are shared by the worker and load_now.
+        self._cache_lock = threading.Lock()
+        self._config_mtime = None
+
+        self.reload_config()
+        app.taskMgr.add(self._poll_converted_task, "SceneRegistryPoll")
+        if watch_interval:
+            app.taskMgr.doMethodLater(watch_interval, self._watch_task, "SceneRegistryWatch")
+
+    def reload_config(self):
+        entries = []
+        if os.path.exists(self.config_path):
+            self._config_mtime = os.path.getmtime(self.config_path)
+            with open(self.config_path) as f:
+                config = json.load(f)
+            self.default = config.get("default")
+            entries = config.get("scenes", [])
+        else:
+            self.default = None
+
+        order = []
+        for item in entries:
+            path = os.path.join(self.scene_dir, item["file"])
+            if not os.path.exists(path):
+                print(f"[Scenes] Skipping '{item['name']}': {path} not found")
+                continue
+            entry = self.entries.get(item["name"])
+            if entry is None or entry.path != path:
+                entry = SceneEntry(item["name"], path)
+                self.entries[item["name"]] = entry
+            entry.description = item.get("description", "")
+            entry.preload = item.get("preload", False)
+            order.append(item["name"])
+
+        # No usable registry: fall back to the first model found in scenes/.
+        if not order and os.path.isdir(self.scene_dir):
+            for file in sorted(os.listdir(self.scene_dir)):
+                if file.lower().endswith(SCENE_EXTENSIONS):
+                    name = os.path.splitext(file)[0]
+                    self.entries.setdefault(name, SceneEntry(name, os.path.join(self.scene_dir, file)))
+                    order.append(name)
+                    break
+
+        self.order = order
+        for name in order:
+            if self.preload and self.entries[name].preload:
+                self.request(name)
+
+    def initial_scene(self):
+        if self.default in self.entries:
+            return self.default
+        return self.order[0] if self.order else None
+
+    def load_now(self, name):
+        # Blocking load for startup, before the first frame is drawn.
+        entry = self.entries[name]
+        entry.mtime = os.path.getmtime(entry.path)
+        with self._cache_lock:
+            entry.node = self.cache.load(self.app.loader, entry.path)
+        return entry.node
+
+    def request(self, name, activate=False):
+        entry = self.entries[name]
+        if activate:
+            self._pending_activate = name
+        if entry.loading:
+            return
+        entry.loading = True
+        self._requests.put(entry)
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._convert_worker, daemon=True)
+            self._worker.start()
+
+    def _convert_worker(self):
+        # One thread converts requests in order, so conversions never race each other.
+        while True:
+            entry = self._requests.get()
+            try:
+                mtime = os.path.getmtime(entry.path)
+                if entry.path.lower().endswith(".bam"):
+                    bam_path = entry.path
+                else:
+                    with self._cache_lock:
+                        bam_path = self.cache.cache_path(entry.path)
+                        if not os.path.exists(bam_path):
+                            self.cache.convert(self.app.loader, entry.path, bam_path)
+                            self.cache.prune(entry.path, keep=bam_path)
+                self._converted.put((entry, bam_path, mtime, None))
+            except Exception as e:
+                self._converted.put((entry, None, None, e))
+
+    def _poll_converted_task(self, task):
+        while True:
+            try:
+                entry, bam_path, mtime, error = self._converted.get_nowait()
+            except queue.Empty:
+                break
+            if error is not None:
+                entry.loading = False
+                print(f"[Scenes] Failed to load '{entry.name}': {error}")
+                continue
+            self.app.loader.loadModel(Filename.fromOsSpecific(os.path.abspath(bam_path)), noCache=True,
+                                      callback=lambda node, entry=entry, mtime=mtime: self._on_loaded(entry, node, mtime))
+        return task.cont
+
+    def _on_loaded(self, entry, node, mtime):
+        entry.loading = False
+        if node is None or node.isEmpty():
+            print(f"[Scenes] Failed to load '{entry.name}'")
+            return
+
+        # Upload textures and vertex buffers now so the swap itself costs nothing.
+        if self.app.win is not None:
+            node.prepareScene(self.app.win.getGsg())
+
+        previous = entry.node
+        entry.node = node
+        entry.mtime = mtime
+        print(f"[Scenes] '{entry.name}' ready")
+
+        if self.active == entry.name and previous is not None:
+            self._swap_in(entry, previous)
+        elif self._pending_activate == entry.name:
+            self.activate(entry.name)
+
+    def activate(self, name):
+        entry = self.entries.get(name)
+        if entry is None:
+            print(f"[Scenes] Unknown scene '{name}'")
+            return False
+        if entry.node is None:
+            self.request(name, activate=True)
+            return False
+
+        self._pending_activate = None
+        current = self.entries.get(self.active)
+        self.active = name
+        self._swap_in(entry, current.node if current and current is not entry else None)
+        return True
+
+    def _swap_in(self, entry, previous):
+        if previous is not None and previous is not entry.node:
+            previous.detachNode()
+        entry.node.reparentTo(self.parent)
+        print(f"[Scenes] Active scene: {entry.name}")
+        if self.on_swap:
+            self.on_swap(entry.name, entry.node)
+
+    def activate_next(self):
+        if not self.order:
+            return
+        index = self.order.index(self.active) + 1 if self.active in self.order else 0
+        self.activate(self.order[index % len(self.order)])
+
+    def _watch_task(self, task):
+        if os.path.exists(self.config_path) and os.path.getmtime(self.config_path) != self._config_mtime:
+            print("[Scenes] config/scenes.json changed, reloading registry")
+            self.reload_config()
+
+        for entry in self.entries.values():
+            if entry.node is None or entry.loading or not os.path.exists(entry.path):
+                continue
+            if os.path.getmtime(entry.path) != entry.mtime:
+                print(f"[Scenes] {entry.path} changed, reloading '{entry.name}'")
+                self.request(entry.name)
+        return task.again
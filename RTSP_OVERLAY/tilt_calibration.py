@@ -0,0 +1,171 @@
+import math
+
+DEFAULT_SETTINGS = {
+    "settle_time": 3.0,         # Ignore samples this long after the first packet
+    "block_seconds": 5.0,       # Length of each streaming-median block
+    "drift_gain": 0.2,          # How far each block moves the offset toward its median
+    "stationary_rate": 0.5,     # deg/s; moving shots are not calibration data
+    "tolerance": 0.5,           # deg of block-to-block spread treated as noise
+    "max_drift": 1.0,           # deg; a block further than this from the offset is a framed shot, not drift
+    "confirm_blocks": 2,        # agreeing blocks before the offset is applied
+    "min_block_samples": 30,
+}
+
+settings = dict(DEFAULT_SETTINGS)
+
+
+def configure(**overrides):
+    unknown = set(overrides) - set(DEFAULT_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown tilt calibration setting(s): {', '.join(sorted(unknown))}")
+    settings.update(overrides)
+
+
+class P2Quantile:
+    """P² streaming quantile estimator (Jain & Chlamtac): five markers, O(1) memory per sample."""
+
+    def __init__(self, p=0.5):
+        self.p = p
+        self.reset()
+
+    def reset(self):
+        p = self.p
+        self.count = 0
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        q = self.heights
+        if self.count < 5:
+            q.append(x)
+            self.count += 1
+            if self.count == 5:
+                q.sort()
+            return
+        self.count += 1
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = self._parabolic(i, d)
+                if not q[i - 1] < candidate < q[i + 1]:
+                    candidate = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = candidate
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self):
+        if self.count == 0:
+            return None
+        if self.count < 5:
+            return sorted(self.heights)[(self.count - 1) // 2]
+        return self.heights[2]
+
+
+class TiltCalibrator:
+    """Continuously estimates the resting tilt offset from stationary FreeD samples.
+
+    Samples are folded into a P² median per time block; each finished block
+    within `max_drift` of the offset nudges it by `drift_gain`, so slow drift
+    is followed for the whole session without storing samples. Blocks further
+    away are a deliberately tilted shot and are rejected. Until
+    `confirm_blocks` blocks agree the offset is only a candidate: a
+    disagreeing block replaces it, and `established` stays False.
+    `confidence` rises with agreeing blocks and falls when they disagree.
+    """
+
+    def __init__(self, **overrides):
+        config = dict(settings, **overrides)
+        self.settle_time = config["settle_time"]
+        self.block_seconds = config["block_seconds"]
+        self.drift_gain = config["drift_gain"]
+        self.stationary_rate = config["stationary_rate"]
+        self.tolerance = config["tolerance"]
+        self.min_block_samples = config["min_block_samples"]
+        self.max_drift = config["max_drift"]
+        self.confirm_blocks = config["confirm_blocks"]
+        self.median = P2Quantile(0.5)
+        self.reset()
+
+    def reset(self):
+        self.offset = 0.0
+        self.blocks = 0
+        self.rejected = 0
+        self.deviation = 0.0
+        self.first_sample_time = None
+        self.block_start = None
+        self.median.reset()
+
+    @property
+    def established(self):
+        return self.blocks >= self.confirm_blocks
+
+    @property
+    def confidence(self):
+        if not self.established:
+            return 0.0
+        agreement = math.exp(-self.deviation / self.tolerance)
+        return (1.0 - 0.5 ** self.blocks) * agreement
+
+    def add(self, raw_tilt, tilt_rate, t):
+        if self.first_sample_time is None:
+            self.first_sample_time = t
+        if t - self.first_sample_time < self.settle_time:
+            return False
+        if self.block_start is None:
+            self.block_start = t
+
+        if abs(tilt_rate) <= self.stationary_rate:
+            self.median.add(raw_tilt)
+
+        if t - self.block_start < self.block_seconds:
+            return False
+        self.block_start = t
+        if self.median.count < self.min_block_samples:
+            self.median.reset()
+            return False
+
+        block_median = self.median.value()
+        self.median.reset()
+        error = block_median - self.offset
+        if self.blocks and abs(error) > self.max_drift:
+            if self.established:
+                self.rejected += 1
+                return False
+            # The candidate was never confirmed; start over from this block.
+            self.blocks = 0
+        if self.blocks == 0:
+            self.offset = block_median
+            self.deviation = 0.0
+        else:
+            self.deviation += self.drift_gain * (abs(error) - self.deviation)
+            self.offset += self.drift_gain * error
+        self.blocks += 1
+        if self.blocks == self.confirm_blocks:
+            print(f"[Tilt Calibration] Median tilt offset set to {self.offset:.2f}°")
+        return True
@@ -0,0 +1,87 @@
+import json
+import os
+from panda3d.core import Camera, PerspectiveLens
+from camera_state import get_camera_state
+from lens import LinearLens, default_lens, load_lens_profile, load_lens_registry
+from spatial_index import update_lod_scale
+
+CONFIG_PATH = os.path.join("config", "cameras.json")
+
+
+def apply_tracked_pose(camera, lens, x, y, z, pan, tilt, zoom, lens_mapping=default_lens, focus=0):
+    camera.setPos(x, y, z)
+    # decode_d1 already yields true degrees, so the virtual camera turns exactly as far as the head.
+    camera.setHpr(pan, tilt, 0)
+    fov = lens_mapping.fov(zoom, focus)
+    lens.setFov(fov)
+    # Zoomed in, distant detail covers more pixels; keep LOD switches in screen space.
+    update_lod_scale(camera, fov)
+
+
+def load_camera_config(path=CONFIG_PATH):
+    if not os.path.exists(path):
+        return {"views": []}
+    with open(path) as f:
+        return json.load(f)
+
+
+class TrackedView:
+    """One FreeD camera ID rendered into a window display region or an offscreen texture buffer."""
+
+    def __init__(self, app, camera_id, region=(0, 1, 0, 1), buffer_size=None, lens_mapping=None):
+        self.app = app
+        self.camera_id = camera_id
+        self.state = get_camera_state(camera_id)
+        self.lens_mapping = lens_mapping or default_lens
+        self.buffer = None
+        self.texture = None
+
+        self.lens = PerspectiveLens()
+        node = Camera(f"tracked_cam_{camera_id}", self.lens)
+        self.camera = app.render.attachNewNode(node)
+
+        if buffer_size:
+            width, height = buffer_size
+            self.buffer = app.win.makeTextureBuffer(f"tracked_buffer_{camera_id}", width, height)
+            self.texture = self.buffer.getTexture()
+            self.region = self.buffer.makeDisplayRegion()
+        else:
+            left, right, bottom, top = region
+            width = (right - left) * app.win.getXSize()
+            height = (top - bottom) * app.win.getYSize()
+            self.region = app.win.makeDisplayRegion(left, right, bottom, top)
+            self.region.setClearColorActive(True)
+            self.region.setClearColor((0, 0, 0, 1))
+            self.region.setClearDepthActive(True)
+        self.region.setCamera(self.camera)
+        self.lens.setAspectRatio(width / float(height))
+
+    def update(self, at=None):
+        pose = self.state.snapshot()
+        pan, tilt, zoom = self.state.predict(at=at, pose=pose)
+        apply_tracked_pose(self.camera, self.lens, pose.x, pose.y, pose.z, pan, tilt, zoom,
+                           self.lens_mapping, pose.focus)
+
+    def destroy(self):
+        if self.buffer:
+            self.app.graphicsEngine.removeWindow(self.buffer)
+        else:
+            self.app.win.removeDisplayRegion(self.region)
+        self.camera.removeNode()
+
+
+def build_tracked_views(app, config=None, lenses=None):
+    config = config or load_camera_config()
+    lenses = lenses or load_lens_registry()
+    views = []
+    for entry in config.get("views", []):
+        if "lens" in entry:
+            lens_mapping = LinearLens(**entry["lens"])
+        elif "lens_profile" in entry:
+            lens_mapping = load_lens_profile(entry["lens_profile"])
+        else:
+            lens_mapping = lenses.for_camera(entry["camera_id"])
+        buffer_size = entry.get("buffer_size")
+        views.append(TrackedView(app, entry["camera_id"], tuple(entry.get("region", (0, 1, 0, 1))),
+                                 tuple(buffer_size) if buffer_size else None, lens_mapping))
+    return views
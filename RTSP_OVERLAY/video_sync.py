@@ -0,0 +1,136 @@
+import time
+from collections import deque
+import cv2
+import numpy as np
+
+MOTION_WIDTH = 160  # frames are shrunk to this width before phase correlation
+
+
+class VideoSync:
+    """Matches each video frame with the tracking pose from the moment it was shot.
+
+    Video (encode, network, decode) lags FreeD by a roughly constant delay, so
+    rendering the newest pose under an older frame makes the overlay swim
+    during pans. The scene is rendered at the frame's capture time minus that
+    delay instead; nothing is buffered, so no latency is added on top of what
+    the video already has.
+
+    With auto_estimate, the delay is measured by correlating global image
+    motion between consecutive frames with the tracked pan/tilt speed at each
+    candidate lag, and the best lag replaces video_delay_ms once its
+    correlation reaches min_correlation. A plain green backdrop carries little
+    texture to measure, so the configured delay remains the fallback.
+    """
+
+    def __init__(self, state, enabled=True, video_delay_ms=120.0, auto_estimate=True,
+                 max_delay_ms=400.0, step_ms=5.0, window_s=6.0, min_correlation=0.6,
+                 estimate_interval_s=1.0, stale_after_s=0.5):
+        self.state = state
+        self.enabled = enabled
+        self.video_delay_ms = video_delay_ms
+        self.auto_estimate = auto_estimate
+        self.lags = np.arange(0.0, max_delay_ms + step_ms / 2, step_ms) / 1000.0
+        self.window_s = window_s
+        self.min_correlation = min_correlation
+        self.estimate_interval_s = estimate_interval_s
+        self.stale_after_s = stale_after_s
+
+        self.estimated_ms = None
+        self.correlation = 0.0
+        self.motion = deque()  # (previous frame time, frame time, image speed in px/s)
+        self._last_estimate = 0.0
+        self._prev = None
+        self._prev_t = None
+        self._small = self._gray = self._cur = self._window = None
+
+    @property
+    def delay_ms(self):
+        if self.auto_estimate and self.estimated_ms is not None:
+            return self.estimated_ms
+        return self.video_delay_ms
+
+    def frame_time(self, frame):
+        # When the frame was shot, on our clock: minus time queued before we got it, minus the transport delay.
+        return frame.t - (frame.age + self.delay_ms) / 1000.0
+
+    def pose_for(self, frame, now=None):
+        """The pose matching `frame`, or None if sync is off or the video has stalled."""
+        if not self.enabled or frame is None:
+            return None
+        if (now or time.monotonic()) - frame.t > self.stale_after_s:
+            return None
+        return self.state.pose_at(self.frame_time(frame))
+
+    def observe(self, frame):
+        # Call once per new frame; measures image motion and periodically re-estimates the delay.
+        if not (self.enabled and self.auto_estimate):
+            return
+        image = frame.image
+        h, w = image.shape[:2]
+        size = (MOTION_WIDTH, max(8, MOTION_WIDTH * h // w))
+        if self._small is None or self._small.shape[1::-1] != size:
+            self._small = np.empty((size[1], size[0], 3), np.uint8)
+            self._gray = np.empty((size[1], size[0]), np.uint8)
+            self._cur = np.empty((size[1], size[0]), np.float32)
+            self._prev = np.empty_like(self._cur)
+            self._window = cv2.createHanningWindow(size, cv2.CV_32F)
+            self._prev_t = None
+
+        cv2.resize(image, size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        np.copyto(self._cur, self._gray)
+        t = frame.t - frame.age / 1000.0
+        if self._prev_t is not None and t > self._prev_t:
+            (dx, dy), _ = cv2.phaseCorrelate(self._prev, self._cur, self._window)
+            self.motion.append((self._prev_t, t, np.hypot(dx, dy) / (t - self._prev_t)))
+            while self.motion and self.motion[0][1] < t - self.window_s:
+                self.motion.popleft()
+        self._prev, self._cur = self._cur, self._prev
+        self._prev_t = t
+
+        if t - self._last_estimate >= self.estimate_interval_s:
+            self._last_estimate = t
+            self.estimate()
+
+    def estimate(self):
+        if len(self.motion) < 30:
+            return None
+        start, end, motion = np.array(self.motion).T
+        poses = self.state.history.since(start[0] - self.lags[-1])
+        if len(poses) < 30:
+            return None
+        pose_t = np.array([p.t for p in poses])
+        pan = np.array([p.pan for p in poses])
+        tilt = np.array([p.tilt for p in poses])
+
+        # One row per candidate lag: how far the rendered pose moves between each frame pair, that much earlier.
+        # Positions rather than filter rates, since positions are what gets rendered.
+        t0 = start[None, :] - self.lags[:, None]
+        t1 = end[None, :] - self.lags[:, None]
+        shifted = np.hypot(np.interp(t1, pose_t, pan) - np.interp(t0, pose_t, pan),
+                           np.interp(t1, pose_t, tilt) - np.interp(t0, pose_t, tilt)) / (end - start)
+        shifted -= shifted.mean(axis=1, keepdims=True)
+        motion = motion - motion.mean()
+        norms = np.linalg.norm(shifted, axis=1) * np.linalg.norm(motion)
+        if not norms.any():
+            return None  # the camera hasn't moved in the window; nothing to learn from
+        r = shifted @ motion / np.where(norms > 0, norms, np.inf)
+        best = int(np.argmax(r))
+        if r[best] < self.min_correlation:
+            return None
+        self.correlation = float(r[best])
+        measured = self.lags[best] * 1000.0
+        if self.estimated_ms is None:
+            self.estimated_ms = measured
+        else:
+            self.estimated_ms += 0.3 * (measured - self.estimated_ms)
+        return self.estimated_ms
+
+    def format(self):
+        if not self.enabled:
+            return "sync: off"
+        if self.estimated_ms is None:
+            source = "configured" if not self.auto_estimate else "configured, estimating"
+            return f"sync: video delay {self.delay_ms:.0f} ms ({source})"
+        return (f"sync: video delay {self.delay_ms:.0f} ms "
+                f"(auto, r {self.correlation:.2f}; configured {self.video_delay_ms:.0f} ms)")
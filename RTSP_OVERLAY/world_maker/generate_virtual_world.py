@@ -1,4 +1,5 @@
 import bpy
+import mathutils
 import os
 
 # Clear existing scene
@@ -18,6 +19,39 @@ bsdf = ground_mat.node_tree.nodes.get("Principled BSDF")
 bsdf.inputs["Base Color"].default_value = (0.2, 0.6, 0.2, 1)
 ground.data.materials.append(ground_mat)
 
+# One mesh (and material) per prop type; every repeat is a linked duplicate that
+# only carries its own transform, so the GLB stores each shape once.
+def make_material(name, color):
+    mat = bpy.data.materials.new(name=name)
+    mat.use_nodes = True
+    bsdf = mat.node_tree.nodes.get("Principled BSDF")
+    bsdf.inputs["Base Color"].default_value = color
+    return mat
+
+def make_shared_mesh(add_primitive, name, material, **kwargs):
+    add_primitive(location=(0, 0, 0), **kwargs)
+    template = bpy.context.active_object
+    mesh = template.data
+    mesh.name = name
+    mesh.materials.append(material)
+    bpy.data.objects.remove(template)
+    return mesh
+
+def place(mesh, name, location):
+    obj = bpy.data.objects.new(name, mesh)
+    obj.location = location
+    bpy.context.collection.objects.link(obj)
+    return obj
+
+building_mesh = make_shared_mesh(bpy.ops.mesh.primitive_cube_add, "BuildingMesh",
+                                 make_material("BuildingMaterial", (0.5, 0.5, 0.5, 1)), size=2)
+trunk_mesh = make_shared_mesh(bpy.ops.mesh.primitive_cylinder_add, "TrunkMesh",
+                              make_material("TrunkMaterial", (0.4, 0.25, 0.1, 1)), radius=0.3, depth=2)
+leaves_mesh = make_shared_mesh(bpy.ops.mesh.primitive_uv_sphere_add, "LeavesMesh",
+                               make_material("LeavesMaterial", (0.1, 0.5, 0.1, 1)), radius=1)
+# Bake the building's 2x height into the shared mesh so instances stay unscaled.
+building_mesh.transform(mathutils.Matrix.Diagonal((1, 1, 2, 1)))
+
 # Add buildings with camera buffer zone cleared
 for i in range(-3, 4):
     for j in range(-3, 4):
@@ -25,35 +59,17 @@ for i in range(-3, 4):
         if -2 <= x <= 2 and -12 <= y <= -6:
             continue  # Skip near-camera zone
         if (i + j) % 2 == 0:
-            bpy.ops.mesh.primitive_cube_add(size=2, location=(x, y, 1))
-            cube = bpy.context.active_object
-            cube.scale[2] = 2
-            cube.location[2] = 2
-
-            mat = bpy.data.materials.new(name=f"BuildingMaterial_{i}_{j}")
-            mat.use_nodes = True
-            bsdf = mat.node_tree.nodes.get("Principled BSDF")
-            bsdf.inputs["Base Color"].default_value = (0.5, 0.5, 0.5, 1)
-            cube.data.materials.append(mat)
+            place(building_mesh, f"Building_{i}_{j}", (x, y, 2))
 
 # Add trees
 for x in range(-20, 25, 10):
     for y in range(-20, 25, 10):
-        bpy.ops.mesh.primitive_cylinder_add(radius=0.3, depth=2, location=(x, y, 1))
-        trunk = bpy.context.active_object
-        trunk_mat = bpy.data.materials.new(name="TrunkMaterial")
-        trunk_mat.use_nodes = True
-        bsdf = trunk_mat.node_tree.nodes.get("Principled BSDF")
-        bsdf.inputs["Base Color"].default_value = (0.4, 0.25, 0.1, 1)
-        trunk.data.materials.append(trunk_mat)
+        place(trunk_mesh, f"Trunk_{x}_{y}", (x, y, 1))
+        place(leaves_mesh, f"Leaves_{x}_{y}", (x, y, 2.5))
 
-        bpy.ops.mesh.primitive_uv_sphere_add(radius=1, location=(x, y, 2.5))
-        leaves = bpy.context.active_object
-        leaves_mat = bpy.data.materials.new(name="LeavesMaterial")
-        leaves_mat.use_nodes = True
-        bsdf = leaves_mat.node_tree.nodes.get("Principled BSDF")
-        bsdf.inputs["Base Color"].default_value = (0.1, 0.5, 0.1, 1)
-        leaves.data.materials.append(leaves_mat)
+objects = [o for o in bpy.context.scene.objects if o.type == 'MESH']
+print(f"Draw calls: {len(objects)} objects before instancing, "
+      f"{len({o.data.name for o in objects})} shared meshes after")
 
 # Lighting
 bpy.ops.object.light_add(type='SUN', location=(10, -10, 20))
@@ -64,5 +80,6 @@ bpy.ops.object.camera_add(location=(0, -30, 15), rotation=(1.1, 0, 0))
 bpy.context.scene.camera = bpy.context.active_object
 
 # Export to GLB
-bpy.ops.export_scene.gltf(filepath=output_path, export_format='GLB')
+# EXT_mesh_gpu_instancing lets loaders draw each shared mesh with one instanced call.
+bpy.ops.export_scene.gltf(filepath=output_path, export_format='GLB', export_gpu_instances=True)
 print("✅ Exported to:", output_path)
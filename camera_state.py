@@ -1,15 +1,36 @@
+from collections import namedtuple
+
+
+# Immutable snapshot of one complete pose. The writer builds a new one per
+# packet and publishes it with a single reference assignment, so a reader
+# always sees every field from the same packet and never allocates.
+class CameraPose(namedtuple("CameraPose", "seq pan tilt zoom x y z focus", defaults=(0,))):
+    __slots__ = ()
+
+
 class CameraState:
     def __init__(self):
-        self.x = 0      # Fixed position
-        self.y = -10    # Fixed distance back
-        self.z = 2      # Eye level
-        self.pan = 0
-        self.tilt = 0
-        self.zoom = 0
+        self.pose = CameraPose(seq=0, pan=0, tilt=0, zoom=0,
+                               x=0,     # Fixed position
+                               y=-10,   # Fixed distance back
+                               z=2)     # Eye level
+
+    def snapshot(self):
+        return self.pose
+
+    def publish(self, pan, tilt, zoom, x, y, z, focus=0):
+        self.pose = CameraPose(self.pose.seq + 1, pan, tilt, zoom, x, y, z, focus)
 
     def update_from_freed(self, pan, tilt, zoom=0):
-        self.pan = pan
-        self.tilt = tilt
-        self.zoom = zoom  # (optional – placeholder if you decide to scale FOV)
+        pose = self.pose
+        self.publish(pan, tilt, zoom, pose.x, pose.y, pose.z)
+
+    # Read-only views of the latest pose; use snapshot() to read several fields consistently.
+    pan = property(lambda self: self.pose.pan)
+    tilt = property(lambda self: self.pose.tilt)
+    zoom = property(lambda self: self.pose.zoom)
+    x = property(lambda self: self.pose.x)
+    y = property(lambda self: self.pose.y)
+    z = property(lambda self: self.pose.z)
 
 shared_camera = CameraState()
@@ -0,0 +1,141 @@
+import struct
+import numpy as np
+
+# FreeD D1 message (29 bytes):
+#   0      message type (0xD1)
+#   1      camera ID
+#   2-4    pan    signed, degrees * 32768
+#   5-7    tilt   signed, degrees * 32768
+#   8-10   roll   signed, degrees * 32768
+#   11-13  X      signed, mm * 64
+#   14-16  Y      signed, mm * 64
+#   17-19  Z      signed, mm * 64
+#   20-22  zoom   unsigned encoder counts
+#   23-25  focus  unsigned encoder counts
+#   26-27  spare
+#   28     checksum = (0x40 - sum(bytes 0..27)) & 0xFF
+D1_MESSAGE = 0xD1
+D1_PACKET_SIZE = 29
+ANGLE_SCALE = 32768.0
+POSITION_SCALE = 64.0
+
+# Each 24-bit field is read as a high byte plus a 16-bit word, so one
+# unpack_from() decodes the whole packet without slicing the datagram.
+# A signed high byte ('b') sign-extends the combined value for free.
+_D1_STRUCT = struct.Struct(">BB" + "bH" * 6 + "BH" * 2 + "HB")
+
+D1_DTYPE = np.dtype([
+    ("camera_id", np.uint8),
+    ("pan", np.float64),
+    ("tilt", np.float64),
+    ("roll", np.float64),
+    ("x", np.float64),
+    ("y", np.float64),
+    ("z", np.float64),
+    ("zoom", np.int32),
+    ("focus", np.int32),
+    ("valid", np.bool_),
+])
+
+
+def d1_checksum(buf, offset=0):
+    return (0x40 - sum(memoryview(buf)[offset:offset + D1_PACKET_SIZE - 1])) & 0xFF
+
+
+def is_valid_d1(buf, offset=0, length=None):
+    if length is None:
+        length = len(buf) - offset
+    if length < D1_PACKET_SIZE or buf[offset] != D1_MESSAGE:
+        return False
+    return d1_checksum(buf, offset) == buf[offset + D1_PACKET_SIZE - 1]
+
+
+def decode_d1(buf, offset=0, length=None, verify=True):
+    """Decode one D1 packet from any bytes-like buffer without copying it.
+
+    Returns (camera_id, pan, tilt, roll, x, y, z, zoom, focus) with angles in
+    degrees and positions in millimetres, or None if the packet is malformed.
+    """
+    if length is None:
+        length = len(buf) - offset
+    if length < D1_PACKET_SIZE or buf[offset] != D1_MESSAGE:
+        return None
+    if verify and d1_checksum(buf, offset) != buf[offset + D1_PACKET_SIZE - 1]:
+        return None
+
+    (_, cam,
+     pan_h, pan_l, tilt_h, tilt_l, roll_h, roll_l,
+     x_h, x_l, y_h, y_l, z_h, z_l,
+     zoom_h, zoom_l, focus_h, focus_l, _, _) = _D1_STRUCT.unpack_from(buf, offset)
+
+    return (
+        cam,
+        ((pan_h << 16) | pan_l) / ANGLE_SCALE,
+        ((tilt_h << 16) | tilt_l) / ANGLE_SCALE,
+        ((roll_h << 16) | roll_l) / ANGLE_SCALE,
+        ((x_h << 16) | x_l) / POSITION_SCALE,
+        ((y_h << 16) | y_l) / POSITION_SCALE,
+        ((z_h << 16) | z_l) / POSITION_SCALE,
+        (zoom_h << 16) | zoom_l,
+        (focus_h << 16) | focus_l,
+    )
+
+
+def encode_d1(camera_id, pan, tilt, roll=0.0, x=0.0, y=0.0, z=0.0, zoom=0, focus=0):
+    out = bytearray(D1_PACKET_SIZE)
+    out[0] = D1_MESSAGE
+    out[1] = camera_id & 0xFF
+    fields = (
+        int(round(pan * ANGLE_SCALE)),
+        int(round(tilt * ANGLE_SCALE)),
+        int(round(roll * ANGLE_SCALE)),
+        int(round(x * POSITION_SCALE)),
+        int(round(y * POSITION_SCALE)),
+        int(round(z * POSITION_SCALE)),
+        int(zoom),
+        int(focus),
+    )
+    for i, value in enumerate(fields):
+        out[2 + i * 3:5 + i * 3] = (value & 0xFFFFFF).to_bytes(3, "big")
+    out[28] = d1_checksum(out)
+    return bytes(out)
+
+
+def _field24(raw, start, signed):
+    value = (raw[:, start].astype(np.int32) << 16) | (raw[:, start + 1].astype(np.int32) << 8) | raw[:, start + 2]
+    if signed:
+        value = (value ^ 0x800000) - 0x800000
+    return value
+
+
+def decode_d1_batch(buf, count, stride=D1_PACKET_SIZE, lengths=None, out=None):
+    """Decode `count` packets laid out every `stride` bytes in `buf`.
+
+    Returns a D1_DTYPE structured array; malformed packets have valid=False.
+    Pass `out` (a D1_DTYPE array of at least `count` rows) to reuse storage.
+    """
+    if out is None:
+        out = np.empty(count, dtype=D1_DTYPE)
+    else:
+        out = out[:count]
+    if count == 0:
+        return out
+
+    raw = np.frombuffer(buf, dtype=np.uint8, count=count * stride).reshape(count, stride)[:, :D1_PACKET_SIZE]
+
+    checksum = (0x40 - raw[:, :D1_PACKET_SIZE - 1].sum(axis=1, dtype=np.int64)) & 0xFF
+    valid = (raw[:, 0] == D1_MESSAGE) & (checksum == raw[:, D1_PACKET_SIZE - 1])
+    if lengths is not None:
+        valid &= np.asarray(lengths[:count]) >= D1_PACKET_SIZE
+
+    out["camera_id"] = raw[:, 1]
+    out["pan"] = _field24(raw, 2, True) / ANGLE_SCALE
+    out["tilt"] = _field24(raw, 5, True) / ANGLE_SCALE
+    out["roll"] = _field24(raw, 8, True) / ANGLE_SCALE
+    out["x"] = _field24(raw, 11, True) / POSITION_SCALE
+    out["y"] = _field24(raw, 14, True) / POSITION_SCALE
+    out["z"] = _field24(raw, 17, True) / POSITION_SCALE
+    out["zoom"] = _field24(raw, 20, False)
+    out["focus"] = _field24(raw, 23, False)
+    out["valid"] = valid
+    return out
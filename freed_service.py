@@ -0,0 +1,155 @@
+import asyncio
+import socket
+import threading
+import time
+from freed_protocol import decode_d1
+
+
+class CameraFeed:
+    __slots__ = ("camera_id", "packet", "source", "arrival", "packets")
+
+    def __init__(self, camera_id):
+        self.camera_id = camera_id
+        self.packet = None
+        self.source = None
+        self.arrival = 0.0
+        self.packets = 0
+
+
+class FreeDProtocol(asyncio.DatagramProtocol):
+    def __init__(self, service, endpoint):
+        self.service = service
+        self.endpoint = endpoint
+
+    def datagram_received(self, data, addr):
+        self.service.ingest(data, addr)
+
+    def error_received(self, exc):
+        print(f"[FreeD] Socket error on {self.endpoint[0]}:{self.endpoint[1]}: {exc}")
+
+
+class FreeDIngestService:
+    """One event loop serving every FreeD endpoint, demultiplexed by D1 camera ID.
+
+    on_pose(camera_id, packet, arrival) runs on the loop thread with the newest
+    decoded packet for each camera and its monotonic arrival time; bursts that
+    arrive within one loop iteration are coalesced so the handler only sees the
+    latest pose. on_datagram(data, addr, arrival), if given, sees every raw
+    datagram before decoding (used for session capture).
+    """
+
+    def __init__(self, endpoints, on_pose=None, rcvbuf_bytes=None, on_datagram=None):
+        self.endpoints = [tuple(e) for e in endpoints]
+        self.on_pose = on_pose
+        self.on_datagram = on_datagram
+        self.rcvbuf_bytes = rcvbuf_bytes
+        self.cameras = {}
+        self.received = 0
+        self.malformed = 0
+        self.coalesced = 0
+        self.flushes = 0
+
+        self.loop = None
+        self.thread = None
+        self.transports = []
+        self._pending = {}
+        self._ready = threading.Event()
+
+    def _make_socket(self, ip, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if self.rcvbuf_bytes:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf_bytes)
+        sock.bind((ip, port))
+        sock.setblocking(False)
+        return sock
+
+    async def open(self):
+        self.loop = asyncio.get_running_loop()
+        for ip, port in self.endpoints:
+            transport, _ = await self.loop.create_datagram_endpoint(
+                lambda endpoint=(ip, port): FreeDProtocol(self, endpoint),
+                sock=self._make_socket(ip, port))
+            self.transports.append(transport)
+            print(f"[FreeD] Listening on {ip}:{port}")
+
+    def close(self):
+        for transport in self.transports:
+            transport.close()
+        self.transports = []
+
+    def ingest(self, data, addr):
+        arrival = time.monotonic()
+        self.received += 1
+        if self.on_datagram is not None:
+            self.on_datagram(data, addr, arrival)
+        packet = decode_d1(data)
+        if packet is None:
+            self.malformed += 1
+            return
+
+        camera_id = packet[0]
+        feed = self.cameras.get(camera_id)
+        if feed is None:
+            feed = self.cameras[camera_id] = CameraFeed(camera_id)
+            print(f"[FreeD] Camera {camera_id} online from {addr[0]}")
+        feed.packet = packet
+        feed.source = addr
+        feed.arrival = arrival
+        feed.packets += 1
+
+        if not self._pending:
+            self.loop.call_soon(self._flush)
+        elif camera_id in self._pending:
+            self.coalesced += 1
+        self._pending[camera_id] = packet
+
+    def _flush(self):
+        pending, self._pending = self._pending, {}
+        self.flushes += 1
+        if self.on_pose is None:
+            return
+        for camera_id, packet in pending.items():
+            try:
+                self.on_pose(camera_id, packet, self.cameras[camera_id].arrival)
+            except Exception as e:
+                print(f"[FreeD] Error applying camera {camera_id}: {e}")
+
+    def get_camera(self, camera_id):
+        return self.cameras.get(camera_id)
+
+    def camera_ids(self):
+        return sorted(self.cameras)
+
+    # Background-thread mode for apps whose main thread belongs to Panda3D.
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self._ready.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self._ready.wait(timeout=5)
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self.open())
+        except OSError as e:
+            print(f"[FreeD] Failed to bind: {e}")
+            self.close()
+            loop.close()
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            self.close()
+            loop.run_until_complete(asyncio.sleep(0))
+            loop.close()
+
+    def stop(self):
+        if self.loop and self.thread and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=2)
+        self.thread = None
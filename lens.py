@@ -0,0 +1,128 @@
+import json
+import os
+import numpy as np
+
+ZOOM_MIN_RAW = 0x000000
+ZOOM_MAX_RAW = 0x400000
+FOCUS_MIN_RAW = 0x000000
+FOCUS_MAX_RAW = 0xFFFFFF
+
+CONFIG_PATH = os.path.join("config", "lenses.json")
+PROFILE_DIR = "lenses"
+
+
+class LinearLens:
+    """Wide-to-tele FOV ramp across the raw FreeD zoom range."""
+
+    def __init__(self, min_fov=3.5, max_fov=60.7, zoom_min=ZOOM_MIN_RAW, zoom_max=ZOOM_MAX_RAW):
+        self.min_fov = min_fov
+        self.max_fov = max_fov
+        self.zoom_min = zoom_min
+        self.zoom_max = zoom_max
+
+    def fov(self, zoom, focus=0):
+        clamped_zoom = max(min(zoom, self.zoom_max), self.zoom_min)
+        zoom_ratio = (clamped_zoom - self.zoom_min) / (self.zoom_max - self.zoom_min)
+        return self.max_fov - zoom_ratio * (self.max_fov - self.min_fov)
+
+
+class LensProfile:
+    """Dense zoom(+focus) → horizontal FOV table sampled on a uniform encoder grid.
+
+    Lookups are O(1): the encoder value maps straight to a table index and the
+    neighbouring entries are blended. Rows are plain lists so the per-frame
+    path never touches NumPy scalars.
+    """
+
+    def __init__(self, name, fov_table, zoom_min, zoom_max, focus_min=FOCUS_MIN_RAW, focus_max=FOCUS_MAX_RAW):
+        table = np.atleast_2d(np.asarray(fov_table, dtype=np.float64))
+        self.name = name
+        self.table = table
+        self.rows = table.tolist()
+        self.zoom_min = zoom_min
+        self.zoom_max = zoom_max
+        self.focus_min = focus_min
+        self.focus_max = focus_max
+        self._zoom_last = table.shape[1] - 1
+        self._focus_last = table.shape[0] - 1
+        self._zoom_scale = self._zoom_last / float(zoom_max - zoom_min)
+        self._focus_scale = self._focus_last / float(focus_max - focus_min) if self._focus_last else 0.0
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(str(data["name"]), data["fov"],
+                       int(data["zoom_min"]), int(data["zoom_max"]),
+                       int(data["focus_min"]), int(data["focus_max"]))
+
+    def save(self, path):
+        np.savez_compressed(path, name=self.name, fov=self.table,
+                            zoom_min=self.zoom_min, zoom_max=self.zoom_max,
+                            focus_min=self.focus_min, focus_max=self.focus_max)
+
+    def _row_value(self, row, u):
+        if u <= 0.0:
+            return row[0]
+        if u >= self._zoom_last:
+            return row[self._zoom_last]
+        i = int(u)
+        frac = u - i
+        return row[i] + (row[i + 1] - row[i]) * frac
+
+    def fov(self, zoom, focus=0):
+        u = (zoom - self.zoom_min) * self._zoom_scale
+        if not self._focus_last:
+            return self._row_value(self.rows[0], u)
+
+        v = (focus - self.focus_min) * self._focus_scale
+        if v <= 0.0:
+            return self._row_value(self.rows[0], u)
+        if v >= self._focus_last:
+            return self._row_value(self.rows[self._focus_last], u)
+        j = int(v)
+        near = self._row_value(self.rows[j], u)
+        far = self._row_value(self.rows[j + 1], u)
+        return near + (far - near) * (v - j)
+
+
+class LensRegistry:
+    """Profiles loaded once at startup and selected per FreeD camera ID."""
+
+    def __init__(self, default=None, by_camera=None):
+        self.default = default or LinearLens()
+        self.by_camera = by_camera or {}
+
+    def for_camera(self, camera_id=None):
+        return self.by_camera.get(camera_id, self.default)
+
+
+def load_lens_profile(name, profile_dir=PROFILE_DIR):
+    if name is None:
+        return None
+    if name == "linear":
+        return LinearLens()
+    path = name if name.endswith(".npz") else os.path.join(profile_dir, f"{name}.npz")
+    profile = LensProfile.load(path)
+    print(f"[Lens] Loaded profile '{profile.name}' ({profile.table.shape[1]} zoom x {profile.table.shape[0]} focus)")
+    return profile
+
+
+def load_lens_registry(path=CONFIG_PATH):
+    if not os.path.exists(path):
+        return LensRegistry()
+    with open(path) as f:
+        config = json.load(f)
+
+    profile_dir = config.get("profile_dir", PROFILE_DIR)
+    loaded = {}
+
+    def get(name):
+        if name not in loaded:
+            loaded[name] = load_lens_profile(name, profile_dir)
+        return loaded[name]
+
+    by_camera = {int(camera_id): get(name) for camera_id, name in config.get("cameras", {}).items()}
+    return LensRegistry(get(config.get("default")), by_camera)
+
+
+default_lens = LinearLens()
@@ -0,0 +1,74 @@
+import argparse
+import os
+import numpy as np
+from lens import LensProfile, ZOOM_MIN_RAW, ZOOM_MAX_RAW, FOCUS_MIN_RAW, FOCUS_MAX_RAW, PROFILE_DIR
+
+# Fits recorded (zoom[, focus], measured FOV) samples and bakes a dense lens profile.
+# Usage: python lens_fit.py samples.csv --name ptz_20x
+# The CSV needs a header with `zoom` and `fov` (horizontal degrees) and optionally `focus`.
+
+
+def design_matrix(zoom_norm, focus_norm, zoom_degree, focus_degree):
+    # Polynomial in normalised zoom, optionally crossed with low-order focus terms.
+    columns = [zoom_norm ** i * focus_norm ** j
+               for j in range(focus_degree + 1)
+               for i in range(zoom_degree + 1)]
+    return np.stack(columns, axis=-1)
+
+
+def fit_profile(name, zoom, fov, focus=None, zoom_degree=7, focus_degree=2,
+                zoom_bins=4096, focus_bins=1,
+                zoom_min=ZOOM_MIN_RAW, zoom_max=ZOOM_MAX_RAW,
+                focus_min=FOCUS_MIN_RAW, focus_max=FOCUS_MAX_RAW):
+    # FOV is far closer to polynomial in log(tan(fov/2)) (i.e. log focal length) than in degrees.
+    target = np.log(np.tan(np.radians(fov) / 2))
+    zoom_norm = (zoom - zoom_min) / float(zoom_max - zoom_min)
+    if focus is None:
+        focus_degree, focus_bins = 0, 1
+        focus_norm = np.zeros_like(zoom_norm)
+    else:
+        focus_norm = (focus - focus_min) / float(focus_max - focus_min)
+
+    coeffs, *_ = np.linalg.lstsq(design_matrix(zoom_norm, focus_norm, zoom_degree, focus_degree), target, rcond=None)
+
+    def evaluate(z, f):
+        return np.degrees(2 * np.arctan(np.exp(design_matrix(z, f, zoom_degree, focus_degree) @ coeffs)))
+
+    residual = evaluate(zoom_norm, focus_norm) - fov
+    grid_f, grid_z = np.meshgrid(np.linspace(0, 1, focus_bins), np.linspace(0, 1, zoom_bins), indexing="ij")
+    table = evaluate(grid_z, grid_f)
+
+    profile = LensProfile(name, table, zoom_min, zoom_max, focus_min, focus_max)
+    return profile, residual
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit a lens profile from (zoom[, focus], fov) samples")
+    parser.add_argument("samples", help="CSV with header: zoom,fov or zoom,focus,fov")
+    parser.add_argument("--name", required=True)
+    parser.add_argument("--out", help=f"output .npz (default {PROFILE_DIR}/<name>.npz)")
+    parser.add_argument("--zoom-degree", type=int, default=7)
+    parser.add_argument("--focus-degree", type=int, default=2)
+    parser.add_argument("--zoom-bins", type=int, default=4096)
+    parser.add_argument("--focus-bins", type=int, default=33)
+    parser.add_argument("--zoom-max", type=lambda v: int(v, 0), default=ZOOM_MAX_RAW)
+    args = parser.parse_args()
+
+    data = np.genfromtxt(args.samples, delimiter=",", names=True)
+    focus = data["focus"] if "focus" in data.dtype.names else None
+    profile, residual = fit_profile(args.name, data["zoom"], data["fov"], focus,
+                                    args.zoom_degree, args.focus_degree,
+                                    args.zoom_bins, args.focus_bins, zoom_max=args.zoom_max)
+
+    if np.any(np.diff(profile.table, axis=1) > 0):
+        print("⚠️ Fitted FOV is not monotonic in zoom; try a lower --zoom-degree or more samples.")
+
+    out = args.out or os.path.join(PROFILE_DIR, f"{args.name}.npz")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    profile.save(out)
+    print(f"✅ {len(residual)} samples, RMS error {np.sqrt(np.mean(residual ** 2)):.3f}°, "
+          f"max {np.max(np.abs(residual)):.3f}° → {out} ({profile.table.shape[1]}x{profile.table.shape[0]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from direct.showbase.ShowBase import ShowBase
-from panda3d.core import Filename, AmbientLight, DirectionalLight, LVector3, Vec3, loadPrcFileData, TextNode
+from panda3d.core import AmbientLight, DirectionalLight, LVector3, Vec3, loadPrcFileData, TextNode
 loadPrcFileData('', 'window-title FreeDumb World')
 loadPrcFileData('', 'win-size 1280 720')
 from direct.gui.DirectGui import DirectEntry, DirectButton, DirectFrame
@@ -9,6 +9,9 @@ import math
 from camera_state import shared_camera
 from direct.task import Task
 from freed_listener import start_freed_listener, stop_freed_listener
+from lens import load_lens_registry
+from spatial_index import update_lod_scale
+from scene_registry import SceneRegistry
 
 class ViewerApp(ShowBase):
     def __init__(self):
@@ -17,6 +20,7 @@ class ViewerApp(ShowBase):
         self.connected = False
         self.ip_address = "192.168.100.88"
         self.angle = 0.0
+        self.lens_mapping = load_lens_registry().for_camera()
 
         self.model_path = os.path.join("scenes")
         self.setup_scene()
@@ -26,17 +30,16 @@ class ViewerApp(ShowBase):
         self.taskMgr.add(self.update_camera_task, "UpdateCamera")
 
     def setup_scene(self):
-        model_path = None
-        for file in os.listdir(self.model_path):
-            if file.lower().endswith((".obj", ".bam", ".glb")):
-                model_path = os.path.join(self.model_path, file)
-                break
-        if not model_path:
+        self.scenes = SceneRegistry(self, scene_dir=self.model_path, on_swap=self.on_scene_swap)
+        name = self.scenes.initial_scene()
+        if not name:
             raise FileNotFoundError("No model found in scenes/")
-        self.scene = self.loader.loadModel(Filename.fromOsSpecific(model_path))
-        self.scene.reparentTo(self.render)
-        self.scene.setScale(1, 1, 1)
-        self.scene.setPos(0, 0, 0)
+        self.scenes.load_now(name)
+        self.scenes.activate(name)
+        self.accept("n", self.scenes.activate_next)
+
+    def on_scene_swap(self, name, scene):
+        self.scene = scene
 
     def setup_lights(self):
         ambient = AmbientLight("ambient")
@@ -111,11 +114,13 @@ class ViewerApp(ShowBase):
 
     def update_camera_task(self, task):
         if self.connected:
-            self.camera.setPos(shared_camera.x, shared_camera.y, shared_camera.z)
-            target_hpr = Vec3(shared_camera.pan * 0.25, shared_camera.tilt * 0.25, 0)
+            pose = shared_camera.snapshot()
+            zoom, focus = pose.zoom, pose.focus
+            self.camera.setPos(pose.x, pose.y, pose.z)
+            target_hpr = Vec3(pose.pan, pose.tilt, 0)
         else:
             self.angle += 0.01
-            shared_camera.zoom = int((0x400000 // 2) * (1 + math.sin(task.time)))
+            zoom, focus = int((0x400000 // 2) * (1 + math.sin(task.time))), 0
             target_hpr = Vec3(task.time * 10 % 360, 10 * math.sin(task.time), 0)
             self.camera.setPos(5 * math.sin(self.angle), -5 * math.cos(self.angle), 1)
 
@@ -123,14 +128,9 @@ class ViewerApp(ShowBase):
         new_hpr = current_hpr + (target_hpr - current_hpr) * 0.1
         self.camera.setHpr(new_hpr)
 
-        zoom_min_raw = 0x000000
-        zoom_max_raw = 0x400000
-        clamped_zoom = max(min(shared_camera.zoom, zoom_max_raw), zoom_min_raw)
-        min_fov = 3.5
-        max_fov = 60.7
-        zoom_ratio = (clamped_zoom - zoom_min_raw) / (zoom_max_raw - zoom_min_raw)
-        fov = max_fov - zoom_ratio * (max_fov - min_fov)
+        fov = self.lens_mapping.fov(zoom, focus)
         self.camLens.setFov(fov)
+        update_lod_scale(self.camera, fov)
         return Task.cont
 
 def load_scene():
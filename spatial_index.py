@@ -0,0 +1,161 @@
+import math
+from panda3d.core import Camera, GeomNode, LODNode, LPoint3, NodePath
+
+# Load-time bounding volume hierarchy for scene models.
+#
+# A flattened scene is one or two huge GeomNodes, so at telephoto FOVs Panda3D
+# still draws nearly all of it. build_spatial_index splits the Geoms into a
+# median-split BVH of PandaNodes (each node's bounds then cull its whole
+# subtree) and flattens only within each leaf. Small Geoms in a leaf go under
+# an LODNode that hides them once they'd cover only a few pixels; the switch
+# distance is set for the widest lens, and update_lod_scale stretches it as
+# the camera zooms in so distant detail comes back when it's actually visible.
+
+# Widest FOV the lens mappings produce; LOD switch distances are computed for it.
+REFERENCE_FOV = 60.7
+LEAF_GEOMS = 16
+MAX_DEPTH = 12
+# Geoms spanning more than this fraction of a cell's long axis stay at that cell.
+LOOSE_FRACTION = 0.5
+# A Geom is "detail" when it's smaller than this fraction of the whole scene ...
+DETAIL_FRACTION = 0.02
+# ... and is hidden once it covers less than this fraction of the screen height.
+MIN_SCREEN_FRACTION = 0.004
+
+
+class _Item:
+    __slots__ = ("geom", "state", "lo", "hi", "center", "size")
+
+    def __init__(self, geom, state, lo, hi):
+        self.geom = geom
+        self.state = state
+        self.lo = lo
+        self.hi = hi
+        self.center = (lo + hi) * 0.5
+        self.size = (hi - lo).length()
+
+
+def _geom_bounds(geom, state):
+    probe = GeomNode("probe")
+    probe.addGeom(geom, state)
+    return NodePath(probe).getTightBounds()
+
+
+def _union(items):
+    lo = LPoint3(items[0].lo)
+    hi = LPoint3(items[0].hi)
+    for item in items[1:]:
+        lo = lo.fmin(item.lo)
+        hi = hi.fmax(item.hi)
+    return lo, hi
+
+
+def lod_scale_for_fov(fov, reference_fov=REFERENCE_FOV):
+    # Projected size ∝ 1 / (distance · tan(fov/2)), so keep screen-space thresholds by scaling distances.
+    return math.tan(math.radians(reference_fov) / 2) / math.tan(math.radians(max(fov, 0.1)) / 2)
+
+
+def update_lod_scale(camera, fov):
+    node = camera.node()
+    scale = lod_scale_for_fov(fov)
+    if isinstance(node, Camera):
+        node.setLodScale(scale)
+    for path in camera.findAllMatches("+Camera"):
+        path.node().setLodScale(scale)
+
+
+class SpatialIndexBuilder:
+    def __init__(self, leaf_geoms=LEAF_GEOMS, max_depth=MAX_DEPTH, loose_fraction=LOOSE_FRACTION,
+                 detail_fraction=DETAIL_FRACTION, min_screen_fraction=MIN_SCREEN_FRACTION,
+                 reference_fov=REFERENCE_FOV):
+        self.leaf_geoms = leaf_geoms
+        self.max_depth = max_depth
+        self.loose_fraction = loose_fraction
+        self.detail_fraction = detail_fraction
+        self.min_screen_fraction = min_screen_fraction
+        self.reference_fov = reference_fov
+        self.cells = 0
+        self.lod_nodes = 0
+        self.detail_size = 0.0
+
+    def collect(self, root):
+        # Bake transforms into vertices and push states onto Geoms, then take every Geom out of the graph.
+        root.clearModelNodes()
+        root.flattenLight()
+        items = []
+        for path in root.findAllMatches("**/+GeomNode"):
+            node = path.node()
+            for i in range(node.getNumGeoms()):
+                geom, state = node.modifyGeom(i), node.getGeomState(i)
+                bounds = _geom_bounds(geom, state)
+                if bounds is not None:
+                    items.append(_Item(geom, state, *bounds))
+        root.getChildren().detach()
+        return items
+
+    def build(self, root):
+        items = self.collect(root)
+        if not items:
+            return root
+        lo, hi = _union(items)
+        self.detail_size = (hi - lo).length() * self.detail_fraction
+        self._split(items, root, "bvh", 0)
+        return root
+
+    def _split(self, items, parent, name, depth):
+        node = parent.attachNewNode(name)
+        self.cells += 1
+        if len(items) <= self.leaf_geoms or depth >= self.max_depth:
+            self._make_leaf(items, node)
+            return
+
+        lo, hi = _union(items)
+        extent = hi - lo
+        axis = max(range(3), key=lambda k: extent[k])
+        limit = extent[axis] * self.loose_fraction
+        large = [item for item in items if item.hi[axis] - item.lo[axis] > limit]
+        rest = [item for item in items if item.hi[axis] - item.lo[axis] <= limit]
+        if large:
+            self._make_leaf(large, node)
+        if len(rest) <= self.leaf_geoms:
+            if rest:
+                self._make_leaf(rest, node)
+            return
+
+        rest.sort(key=lambda item: item.center[axis])
+        middle = len(rest) // 2
+        self._split(rest[:middle], node, f"{name}0", depth + 1)
+        self._split(rest[middle:], node, f"{name}1", depth + 1)
+
+    def _geom_node(self, name, items, parent):
+        node = GeomNode(name)
+        for item in items:
+            node.addGeom(item.geom, item.state)
+        path = parent.attachNewNode(node)
+        # Merge only within the cell; flattening across cells would undo the hierarchy.
+        path.flattenStrong()
+        return path
+
+    def _make_leaf(self, items, parent):
+        detail = [item for item in items if item.size < self.detail_size]
+        solid = [item for item in items if item.size >= self.detail_size]
+        if solid:
+            self._geom_node("geoms", solid, parent)
+        if not detail:
+            return
+
+        lo, hi = _union(detail)
+        largest = max(item.size for item in detail)
+        # Distance at which the largest detail Geom shrinks to min_screen_fraction of the reference view.
+        switch = largest / (2 * math.tan(math.radians(self.reference_fov) / 2) * self.min_screen_fraction)
+        lod = LODNode("detail_lod")
+        lod.setCenter((lo + hi) * 0.5)
+        lod.addSwitch(switch + (hi - lo).length() * 0.5, 0)
+        self._geom_node("detail", detail, parent.attachNewNode(lod))
+        self.lod_nodes += 1
+
+
+def build_spatial_index(root, **options):
+    builder = SpatialIndexBuilder(**options)
+    builder.build(root)
+    return builder
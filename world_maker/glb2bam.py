@@ -1,16 +1,35 @@
 from panda3d.core import loadPrcFileData
 from direct.showbase.ShowBase import ShowBase
+import argparse
+import os
 import sys
 
 loadPrcFileData('', 'window-type offscreen')
+loadPrcFileData('', 'audio-library-name null')
+
+# scene_cache lives next to main.py; run this from the viewer directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scene_cache import SceneCache, CACHE_DIR
 
 class ModelConverter(ShowBase):
-    def __init__(self):
+    def __init__(self, sources, output=None, cache_dir=CACHE_DIR):
         super().__init__()
-        model = self.loader.loadModel("your_file.glb")
-        model.flattenStrong()
-        model.writeBamFile("scenes/your_file.bam")
+        cache = SceneCache(cache_dir)
+        for source in sources:
+            if output:
+                cache.convert(self.loader, source, output)
+                print(f"✅ {source} → {output}")
+            else:
+                # Prime the viewer's startup cache so the first launch is already warm.
+                cache.load(self.loader, source)
         print("✅ Done.")
-        sys.exit()
 
-ModelConverter()
+parser = argparse.ArgumentParser(description="Convert GLB/OBJ scenes to flattened BAM files")
+parser.add_argument("sources", nargs="+", help="scene files to convert")
+parser.add_argument("-o", "--output", help="write a single source to this .bam instead of the cache")
+parser.add_argument("--cache-dir", default=CACHE_DIR)
+args = parser.parse_args()
+if args.output and len(args.sources) > 1:
+    parser.error("--output takes exactly one source")
+
+ModelConverter(args.sources, args.output, args.cache_dir)
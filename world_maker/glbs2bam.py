@@ -1,50 +1,189 @@
-from panda3d.core import loadPrcFileData, Filename, NodePath
-from direct.showbase.ShowBase import ShowBase
-import os, sys
-
-# Run offscreen
-loadPrcFileData('', 'window-type offscreen')
-loadPrcFileData('', 'audio-library-name null')
-
-class GlbSceneBuilder(ShowBase):
-    def __init__(self, glb_dir, output_bam):
-        super().__init__()
-        self.disableMouse()
-        self.scene_root = NodePath("scene_root")
-        self.build_scene(glb_dir)
-        self.export_bam(output_bam)
-
-    def build_scene(self, glb_dir):
-        print(f"📦 Loading assets from: {glb_dir}")
-        glb_files = [f for f in os.listdir(glb_dir) if f.endswith(".glb")]
-
-        if not glb_files:
-            print("⚠️ No .glb files found!")
-            sys.exit(1)
-
-        spacing = 5  # space between objects
-        for i, fname in enumerate(sorted(glb_files)):
-            path = Filename.fromOsSpecific(os.path.join(glb_dir, fname)).getFullpath()
-            model = self.loader.loadModel(path)
-            if not model:
-                print(f"❌ Failed to load {fname}")
+from panda3d.core import loadPrcFileData, Filename, NodePath, Loader, LoaderOptions, PandaSystem
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+# scene_optimize lives next to main.py; run this from the viewer directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scene_optimize import optimize_scene
+
+# Converts a directory tree of .glb props into per-asset flattened BAMs plus one
+# combined scene. Conversions run in a process pool and only changed assets are
+# rebuilt; the manifest in the asset directory remembers what was converted.
+#
+#   python world_maker/glbs2bam.py "./GLB format" --jobs 8
+
+MANIFEST_NAME = "manifest.json"
+PIPELINE_VERSION = 3
+
+_loader = None
+
+
+def _init_worker():
+    # One headless Panda3D loader per worker process; conversion needs no window or GSG.
+    global _loader
+    loadPrcFileData('', 'window-type none')
+    loadPrcFileData('', 'audio-library-name null')
+    loadPrcFileData('', 'notify-level-assimp error')
+    _loader = Loader.getGlobalPtr()
+
+
+def _no_cache_options():
+    options = LoaderOptions()
+    options.setFlags(options.getFlags() | LoaderOptions.LF_no_cache)
+    return options
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def convert_asset(src_path, bam_path, previous_hash):
+    start = time.perf_counter()
+    digest = file_digest(src_path)
+    if digest == previous_hash and os.path.exists(bam_path):
+        return digest, time.perf_counter() - start, False
+
+    node = _loader.loadSync(Filename.fromOsSpecific(os.path.abspath(src_path)), _no_cache_options())
+    if node is None:
+        raise IOError(f"Failed to load {src_path}")
+    model = NodePath(node)
+    # Per-asset BVHs would be too fine; the combined scene gets one instead.
+    optimize_scene(model, spatial=False, verbose=False)
+
+    os.makedirs(os.path.dirname(bam_path), exist_ok=True)
+    tmp_path = bam_path + ".tmp"
+    if not model.writeBamFile(Filename.fromOsSpecific(os.path.abspath(tmp_path))):
+        raise IOError(f"Failed to write {bam_path}")
+    os.replace(tmp_path, bam_path)
+    return digest, time.perf_counter() - start, True
+
+
+def find_assets(src_dir, extensions):
+    assets = []
+    for root, _, files in os.walk(src_dir):
+        for fname in files:
+            if fname.lower().endswith(extensions):
+                assets.append(os.path.relpath(os.path.join(root, fname), src_dir))
+    return sorted(assets)
+
+
+def load_manifest(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get("pipeline") == [PIPELINE_VERSION, PandaSystem.getVersionString()]:
+            return manifest
+        print("♻️ Converter or Panda3D version changed; rebuilding every asset.")
+    return {"pipeline": [PIPELINE_VERSION, PandaSystem.getVersionString()], "assets": {}}
+
+
+def save_manifest(path, manifest):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def build_combined(asset_bams, output_path, spacing=5, columns=5, optimize=True):
+    # Auto-position to avoid overlap (grid pattern), as the original single-process builder did.
+    loader = Loader.getGlobalPtr()
+    scene_root = NodePath("scene_root")
+    for i, (rel, bam_path) in enumerate(asset_bams):
+        node = loader.loadSync(Filename.fromOsSpecific(os.path.abspath(bam_path)), _no_cache_options())
+        if node is None:
+            print(f"❌ Failed to load {bam_path}")
+            continue
+        model = NodePath(node)
+        model.setName(rel)
+        model.setPos((i % columns) * spacing, (i // columns) * spacing, 0)
+        model.reparentTo(scene_root)
+
+    if optimize:
+        # Assets converted separately can still share materials and textures with each other.
+        print("\n🧹 Optimizing combined scene")
+        optimize_scene(scene_root)
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    scene_root.writeBamFile(Filename.fromOsSpecific(os.path.abspath(output_path)))
+    print(f"\n✅ Exported combined scene to: {output_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a tree of GLB assets to BAMs in parallel")
+    parser.add_argument("glb_dir", nargs="?", default="./GLB format", help="directory tree of source assets")
+    parser.add_argument("--output", default="scenes/combined_world.bam", help="combined scene BAM")
+    parser.add_argument("--asset-dir", default=os.path.join("cache", "assets"), help="per-asset BAMs and manifest")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--ext", nargs="+", default=[".glb"], help="source extensions")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and rebuild everything")
+    parser.add_argument("--keep-hierarchy", action="store_true",
+                        help="don't merge states or flatten the combined scene (keeps one node per asset)")
+    args = parser.parse_args()
+
+    print(f"📦 Loading assets from: {args.glb_dir}")
+    assets = find_assets(args.glb_dir, tuple(e.lower() for e in args.ext))
+    if not assets:
+        print("⚠️ No .glb files found!")
+        sys.exit(1)
+
+    os.makedirs(args.asset_dir, exist_ok=True)
+    manifest_path = os.path.join(args.asset_dir, MANIFEST_NAME)
+    manifest = {"pipeline": [PIPELINE_VERSION, PandaSystem.getVersionString()], "assets": {}} if args.force \
+        else load_manifest(manifest_path)
+    previous = manifest["assets"]
+
+    start = time.perf_counter()
+    bams, jobs, skipped = [], {}, 0
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker) as pool:
+        for rel in assets:
+            src_path = os.path.join(args.glb_dir, rel)
+            bam_path = os.path.join(args.asset_dir, os.path.splitext(rel)[0] + ".bam")
+            bams.append((rel, bam_path))
+            stat = os.stat(src_path)
+            entry = previous.get(rel)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime and os.path.exists(bam_path):
+                skipped += 1
+                continue
+            future = pool.submit(convert_asset, src_path, bam_path, entry["hash"] if entry else None)
+            jobs[future] = (rel, stat)
+
+        converted, failed = 0, 0
+        for future in as_completed(jobs):
+            rel, stat = jobs[future]
+            try:
+                digest, seconds, rebuilt = future.result()
+            except Exception as e:
+                failed += 1
+                previous.pop(rel, None)
+                print(f"❌ Failed to convert {rel}: {e}")
                 continue
+            previous[rel] = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": digest}
+            if rebuilt:
+                converted += 1
+                print(f"✅ {rel}  {seconds * 1000:.0f} ms")
+            else:
+                skipped += 1
+                print(f"⏭️ {rel}  unchanged content")
 
-            # Auto-position to avoid overlap (grid pattern)
-            row = i // 5
-            col = i % 5
-            model.setPos(col * spacing, row * spacing, 0)
-            model.reparentTo(self.scene_root)
-            print(f"✅ Loaded: {fname}")
+    # Forget assets that disappeared from the source tree.
+    for rel in set(previous) - set(assets):
+        del previous[rel]
+    save_manifest(manifest_path, manifest)
 
-    def export_bam(self, output_path):
-        output_dir = os.path.dirname(output_path)
-        os.makedirs(output_dir, exist_ok=True)
-        self.scene_root.writeBamFile(output_path)
-        print(f"\n✅ Exported combined scene to: {output_path}")
+    print(f"\n{converted} converted, {skipped} unchanged, {failed} failed "
+          f"in {time.perf_counter() - start:.1f}s with {args.jobs} workers")
+    build_combined([(rel, bam) for rel, bam in bams if rel in previous], args.output,
+                   optimize=not args.keep_hierarchy)
 
-# Edit these paths as needed
-glb_folder = "./GLB format"         # Unzipped directory
-output_bam = "scenes/combined_world.bam"
 
-GlbSceneBuilder(glb_folder, output_bam)
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,87 @@
 from panda3d.core import LVector3, AmbientLight, DirectionalLight, PointLight
-from panda3d.core import TextureStage, Texture
+from panda3d.core import Texture, Shader, GeomEnums, BoundingBox
 from direct.showbase.ShowBase import ShowBase
+from array import array
+import argparse
 import random
 
+# Placement modes:
+#   instance  - one loaded geometry per prop type, placed with instanceTo
+#   flatten   - instance, then bake each prop group into a few merged Geoms (default)
+#   hardware  - one Geom per prop type drawn with GPU instancing from a transform buffer
+INSTANCING_MODES = ("instance", "flatten", "hardware")
+
+INSTANCED_VERTEX = """
+#version 150
+uniform mat4 p3d_ModelViewProjectionMatrix;
+uniform mat4 p3d_ModelViewMatrix;
+uniform mat3 p3d_NormalMatrix;
+uniform samplerBuffer instance_data;
+in vec4 p3d_Vertex;
+in vec3 p3d_Normal;
+out vec3 v_normal;
+out vec3 v_position;
+out vec4 v_color;
+void main() {
+    // Five texels per instance: the four rows of the transform, then the color.
+    int base = gl_InstanceID * 5;
+    mat4 xform = mat4(texelFetch(instance_data, base), texelFetch(instance_data, base + 1),
+                      texelFetch(instance_data, base + 2), texelFetch(instance_data, base + 3));
+    v_color = texelFetch(instance_data, base + 4);
+    vec4 world = xform * p3d_Vertex;
+    gl_Position = p3d_ModelViewProjectionMatrix * world;
+    v_position = vec3(p3d_ModelViewMatrix * world);
+    v_normal = normalize(p3d_NormalMatrix * (mat3(xform) * p3d_Normal));
+}
+"""
+
+INSTANCED_FRAGMENT = """
+#version 150
+uniform struct p3d_LightModelParameters { vec4 ambient; } p3d_LightModel;
+uniform struct p3d_LightSourceParameters { vec4 color; vec4 position; } p3d_LightSource[3];
+in vec3 v_normal;
+in vec3 v_position;
+in vec4 v_color;
+out vec4 p3d_FragColor;
+void main() {
+    vec3 n = normalize(v_normal);
+    vec3 lit = p3d_LightModel.ambient.rgb;
+    for (int i = 0; i < 3; ++i) {
+        vec3 l = normalize(p3d_LightSource[i].position.xyz - v_position * p3d_LightSource[i].position.w);
+        lit += p3d_LightSource[i].color.rgb * max(dot(n, l), 0.0);
+    }
+    p3d_FragColor = vec4(v_color.rgb * lit, v_color.a);
+}
+"""
+
+
+def count_draw_calls(root):
+    # Every Geom reached through every instance path is one draw call (before GPU instancing).
+    return sum(path.node().getNumGeoms() for path in root.findAllMatches('**/+GeomNode'))
+
+
 class DetailedWorld(ShowBase):
-    def __init__(self):
+    def __init__(self, instancing="flatten", density=1):
         super().__init__()
         self.disableMouse()
         self.camera.setPos(0, -60, 20)
         self.camera.lookAt(0, 0, 10)
+        self.density = density
+
+        self.prop_models = {}
+        self.prop_groups = {}
 
         self.setup_lights()
         self.build_room()
         self.add_furniture()
         self.add_decor()
 
+        print(f"[SetBuilder] {sum(g.getNumChildren() for g in self.prop_groups.values())} props, "
+              f"{len(self.prop_models)} shared geometries")
+        print(f"[SetBuilder] Draw calls before '{instancing}': {count_draw_calls(self.render)}")
+        self.finalize_props(instancing)
+        print(f"[SetBuilder] Draw calls after '{instancing}': {self.draw_calls(instancing)}")
+
     def setup_lights(self):
         ambient = AmbientLight("ambient")
         ambient.setColor((0.3, 0.3, 0.3, 1))
@@ -31,13 +98,73 @@ class DetailedWorld(ShowBase):
         plight_np.setPos(0, 0, 25)
         self.render.setLight(plight_np)
 
+    def prop_model(self, model_path):
+        # Each model file is loaded exactly once and shared by every placement.
+        model = self.prop_models.get(model_path)
+        if model is None:
+            model = self.prop_models[model_path] = self.loader.loadModel(model_path)
+        return model
+
+    def place(self, group, model_path, pos, scale, color):
+        root = self.prop_groups.get(group)
+        if root is None:
+            root = self.prop_groups[group] = self.render.attachNewNode(group)
+            root.setPythonTag("model_path", model_path)
+        placement = root.attachNewNode(f"{group}_{root.getNumChildren()}")
+        placement.setPos(*pos)
+        placement.setScale(*scale)
+        placement.setColor(*color)
+        self.prop_model(model_path).instanceTo(placement)
+        return placement
+
+    def finalize_props(self, instancing):
+        if instancing == "flatten":
+            for root in self.prop_groups.values():
+                # ModelRoot nodes stop the reducer; without them, same-state boxes merge into one Geom.
+                root.clearModelNodes()
+                root.flattenStrong()
+        elif instancing == "hardware":
+            shader = Shader.make(Shader.SL_GLSL, INSTANCED_VERTEX, INSTANCED_FRAGMENT)
+            for group, root in list(self.prop_groups.items()):
+                self.prop_groups[group] = self.make_hardware_instanced(group, root, shader)
+
+    def make_hardware_instanced(self, group, root, shader):
+        placements = root.getChildren()
+        data = array("f")
+        for placement in placements:
+            mat = placement.getMat(root)
+            for row in range(4):
+                data.extend(mat.getRow(row))
+            data.extend(placement.getColor())
+
+        buffer = Texture(f"{group}_instances")
+        buffer.setupBufferTexture(len(placements) * 5, Texture.T_float, Texture.F_rgba32, GeomEnums.UH_static)
+        buffer.setRamImage(data.tobytes())
+
+        # The single copy's bounds would cull every other instance; use the whole group's.
+        bounds_min, bounds_max = root.getTightBounds()
+        instanced = self.render.attachNewNode(f"{group}_instanced")
+        self.prop_model(root.getPythonTag("model_path")).copyTo(instanced)
+        instanced.clearModelNodes()
+        instanced.flattenStrong()
+        instanced.setInstanceCount(len(placements))
+        instanced.setShader(shader)
+        instanced.setShaderInput("instance_data", buffer)
+        instanced.node().setBounds(BoundingBox(bounds_min, bounds_max))
+        instanced.node().setFinal(True)
+        root.removeNode()
+        return instanced
+
+    def draw_calls(self, instancing):
+        if instancing != "hardware":
+            return count_draw_calls(self.render)
+        # Each instanced Geom is one call no matter how many copies it draws.
+        return sum(path.node().getNumGeoms() for root in self.prop_groups.values()
+                   for path in root.findAllMatches('**/+GeomNode'))
+
     def build_room(self):
         # Floor
-        floor = self.loader.loadModel("models/box")
-        floor.setScale(40, 40, 0.1)
-        floor.setPos(0, 0, 0)
-        floor.setColor(0.5, 0.5, 0.5, 1)
-        floor.reparentTo(self.render)
+        self.place("floor", "models/box", (0, 0, 0), (40, 40, 0.1), (0.5, 0.5, 0.5, 1))
 
         # Walls
         for x, y, scale_x, scale_y, pos in [
@@ -46,47 +173,34 @@ class DetailedWorld(ShowBase):
             (0, 40, 80, 0.1, (0, 0, 10)),
             (0, -40, 80, 0.1, (0, 0, 10)),
         ]:
-            wall = self.loader.loadModel("models/box")
-            wall.setScale(scale_x, scale_y, 20)
-            wall.setPos(x, y, pos[2])
-            wall.setColor(0.8, 0.85, 0.9, 1)
-            wall.reparentTo(self.render)
+            self.place("walls", "models/box", (x, y, pos[2]), (scale_x, scale_y, 20), (0.8, 0.85, 0.9, 1))
 
         # Ceiling
-        ceiling = self.loader.loadModel("models/box")
-        ceiling.setScale(40, 40, 0.1)
-        ceiling.setPos(0, 0, 20)
-        ceiling.setColor(0.7, 0.7, 0.75, 1)
-        ceiling.reparentTo(self.render)
+        self.place("ceiling", "models/box", (0, 0, 20), (40, 40, 0.1), (0.7, 0.7, 0.75, 1))
 
     def add_furniture(self):
-        for i in range(12):
+        for i in range(12 * self.density):
             x, y = random.uniform(-30, 30), random.uniform(-30, 30)
             z = 0.5
             scale_x = random.uniform(1, 2)
             scale_y = random.uniform(1, 2)
             scale_z = random.uniform(1, 3)
-            box = self.loader.loadModel("models/box")
-            box.setScale(scale_x, scale_y, scale_z)
-            box.setPos(x, y, z)
-            box.setColor(random.uniform(0.4, 0.8), random.uniform(0.3, 0.7), random.uniform(0.3, 0.7), 1)
-            box.reparentTo(self.render)
+            color = (random.uniform(0.4, 0.8), random.uniform(0.3, 0.7), random.uniform(0.3, 0.7), 1)
+            self.place("furniture", "models/box", (x, y, z), (scale_x, scale_y, scale_z), color)
 
     def add_decor(self):
-        for i in range(6):
-            column = self.loader.loadModel("models/box")
-            col_x, col_y = random.choice([(-35, 35)]), random.uniform(-30, 30)
-            column.setScale(0.5, 0.5, 12)
-            column.setPos(col_x, col_y, 6)
-            column.setColor(0.6, 0.6, 0.6, 1)
-            column.reparentTo(self.render)
-
-        for i in range(10):
-            lamp = self.loader.loadModel("models/box")
-            lamp.setScale(0.3, 0.3, 1.2)
-            lamp.setPos(random.uniform(-30, 30), random.uniform(-30, 30), 20)
-            lamp.setColor(1.0, 0.95, 0.6, 1)
-            lamp.reparentTo(self.render)
-
-app = DetailedWorld()
+        for i in range(6 * self.density):
+            col_x, col_y = random.choice((-35, 35)), random.uniform(-30, 30)
+            self.place("columns", "models/box", (col_x, col_y, 6), (0.5, 0.5, 12), (0.6, 0.6, 0.6, 1))
+
+        for i in range(10 * self.density):
+            pos = (random.uniform(-30, 30), random.uniform(-30, 30), 20)
+            self.place("lamps", "models/box", pos, (0.3, 0.3, 1.2), (1.0, 0.95, 0.6, 1))
+
+parser = argparse.ArgumentParser(description="Procedural studio set")
+parser.add_argument("--instancing", choices=INSTANCING_MODES, default="flatten")
+parser.add_argument("--density", type=int, default=1, help="multiply the number of furniture/decor props")
+args = parser.parse_args()
+
+app = DetailedWorld(args.instancing, args.density)
 app.run()